@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Measures the cost and the savings of the message compression policy
+(node.compression) for a typical mix of network messages.
+
+Run from the repository root:
+
+    python -m benchmarks.compression [--messages 20000]
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+
+from node import compression
+
+
+def random_guid():
+    return hashlib.sha1(os.urandom(20)).hexdigest()
+
+
+def plain(msg_type, **fields):
+    msg = {
+        'type': msg_type,
+        'senderGUID': random_guid(),
+        'senderNick': 'Merchant %d' % random.randrange(1000),
+        'uri': 'tcp://10.0.%d.%d:12345' % (random.randrange(256),
+                                           random.randrange(256)),
+        'pubkey': os.urandom(65).encode('hex')
+    }
+    msg.update(fields)
+    return json.dumps(msg)
+
+
+def encrypted(size):
+    # CryptoPeerConnection.send hex-encodes the signature and the ciphertext
+    return json.dumps({
+        'sig': os.urandom(72).encode('hex'),
+        'data': os.urandom(size).encode('hex')
+    })
+
+
+def message_mix():
+    """ (name, weight, factory) for the messages seen on a running node """
+    return [
+        ('hello', 30, lambda: plain('hello')),
+        ('findNode', 30, lambda: encrypted(300)),
+        ('findNodeResponse', 25, lambda: encrypted(3000)),
+        ('store', 15, lambda: encrypted(20000)),
+    ]
+
+
+def build_messages(count):
+    mix = message_mix()
+    total = sum(weight for _, weight, _ in mix)
+    messages = []
+    for name, weight, factory in mix:
+        messages.extend(factory() for _ in xrange(count * weight / total))
+    random.shuffle(messages)
+    return messages
+
+
+def run(messages, level, min_size):
+    raw_bytes = sum(len(msg) for msg in messages)
+
+    start = time.time()
+    wire = [compression.compress(msg, level, min_size) for msg in messages]
+    compress_time = time.time() - start
+
+    start = time.time()
+    for payload in wire:
+        compression.decompress(payload)
+    decompress_time = time.time() - start
+
+    wire_bytes = sum(len(payload) for payload in wire)
+    return (raw_bytes / (compress_time + decompress_time) / 2 ** 20,
+            100.0 * wire_bytes / raw_bytes,
+            (compress_time + decompress_time) / len(messages))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    messages = build_messages(args.messages)
+    print 'messages: %d, %.1f MB' % (
+        len(messages), sum(len(msg) for msg in messages) / 2.0 ** 20)
+    print '%-26s %10s %10s %12s' % ('policy', 'MB/s', 'wire %', 'us/message')
+
+    policies = [
+        ('level 9, no threshold', 9, 0),
+        ('level 6, no threshold', 6, 0),
+        ('level 1, no threshold', 1, 0),
+        ('level 6, min 512 bytes', 6, 512),
+        ('level 1, min 512 bytes', 1, 512),
+        ('uncompressed', 0, 0),
+    ]
+    for name, level, min_size in policies:
+        throughput, ratio, latency = run(messages, level, min_size)
+        print '%-26s %10.1f %10.1f %12.1f' % (name, throughput, ratio,
+                                              latency * 1e6)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Measures datastore lookup latency with and without the secondary indexes
+added by migration4/migration5.
+
+Run from the repository root:
+
+    python -m benchmarks.db_indexes [--rows 100000] [--lookups 1000]
+"""
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from db.migrations import migration4, migration5
+from node.db_store import Obdb
+from node.setup_db import setup_db
+
+
+def populate(db, rows):
+    batch = []
+    for i in xrange(rows):
+        batch.append({
+            'key': hashlib.sha1(str(i)).hexdigest(),
+            'value': 'value-%d' % i,
+            'lastPublished': 0,
+            'originallyPublished': 0,
+            'originalPublisherID': 'publisher',
+            'market_id': 1
+        })
+        if len(batch) == 10000:
+            db.insertMany('datastore', batch)
+            batch = []
+    if batch:
+        db.insertMany('datastore', batch)
+
+
+def time_lookups(db, rows, lookups):
+    keys = [hashlib.sha1(str(random.randrange(rows))).hexdigest()
+            for _ in xrange(lookups)]
+    start = time.time()
+    for key in keys:
+        db.selectEntries('datastore', {'key': key})
+    return (time.time() - start) / lookups
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=1000)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    db_path = os.path.join(tmp_dir, 'bench.db')
+    try:
+        setup_db(db_path)
+        # Start from an index-less schema, as created before migration4
+        migration5.downgrade(db_path)
+        migration4.downgrade(db_path)
+
+        db = Obdb(db_path)
+        populate(db, args.rows)
+
+        before = time_lookups(db, args.rows, args.lookups)
+        db.close()
+
+        migration4.upgrade(db_path)
+        migration5.upgrade(db_path)
+
+        db = Obdb(db_path)
+        after = time_lookups(db, args.rows, args.lookups)
+        db.close()
+
+        print 'datastore rows: %d, lookups: %d' % (args.rows, args.lookups)
+        print 'without indexes: %.3f ms/lookup' % (before * 1000)
+        print 'with indexes:    %.3f ms/lookup' % (after * 1000)
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Compares the JSON (hex encoded) and the binary envelope formats
+(node.envelope): bytes on the wire and CPU spent per message to encode,
+compress, decompress and decode an envelope, excluding the encryption.
+
+Run from the repository root:
+
+    python -m benchmarks.envelope [--messages 20000]
+"""
+import argparse
+import os
+import time
+
+from node import compression, envelope
+
+# Plaintext sizes of typical messages: findNode, findNodeResponse, store
+# [bytes]
+SIZES = (300, 3000, 20000)
+
+
+def ecies_fields(size):
+    # ECIES adds an IV, the ephemeral public key, padding and a MAC
+    return {'sig': os.urandom(72), 'data': os.urandom(size + 150)}
+
+
+def session_fields(size):
+    return {
+        'session': os.urandom(16),
+        'created': int(time.time()),
+        'skey': os.urandom(166),
+        'ssig': os.urandom(72),
+        'spub': os.urandom(65).encode('hex'),
+        'ctr': 1,
+        'iv': os.urandom(16),
+        'data': os.urandom(size),
+        'mac': os.urandom(32)
+    }
+
+
+def run(kind, fields_list, binary):
+    wire_bytes = 0
+    start = time.time()
+    for fields in fields_list:
+        serialized = envelope.encode(kind, fields, binary)
+        if not binary:
+            serialized = compression.compress(serialized)
+        wire_bytes += len(serialized)
+        envelope.decode(compression.decompress(serialized))
+    return wire_bytes, (time.time() - start) / len(fields_list)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    print '%-8s %7s %-7s %12s %12s' % ('kind', 'size', 'format',
+                                       'bytes/msg', 'us/msg')
+    for kind, name, factory in ((envelope.ECIES, 'ecies', ecies_fields),
+                                (envelope.SESSION, 'session',
+                                 session_fields)):
+        for size in SIZES:
+            fields_list = [factory(size) for _ in xrange(args.messages)]
+            for binary in (False, True):
+                wire_bytes, latency = run(kind, fields_list, binary)
+                print '%-8s %7d %-7s %12.0f %12.1f' % (
+                    name, size, 'binary' if binary else 'json',
+                    float(wire_bytes) / args.messages, latency * 1e6)
+
+
+if __name__ == '__main__':
+    main()
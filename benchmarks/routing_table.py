@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Times routing table operations, comparing the bisect based k-bucket lookup
+with the linear scan over the buckets it replaced.
+
+Run from the repository root:
+
+    python -m benchmarks.routing_table [--contacts 10000]
+"""
+import argparse
+import random
+import time
+
+from node import routingtable
+
+
+class Contact(object):
+    def __init__(self, guid):
+        self.guid = guid
+        self.guid_long = long(guid, 16)
+        self.address = 'tcp://127.0.0.1:12345'
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.guid == other.guid
+        elif isinstance(other, str):
+            return self.guid == other
+        return False
+
+
+class LinearScanRoutingTable(routingtable.OptimizedTreeRoutingTable):
+    def kbucketIndex(self, key):
+        valKey = self.keyToLong(key)
+        i = 0
+        for bucket in self.buckets:
+            if bucket.keyInRange(valKey):
+                return i
+            i += 1
+        return i
+
+
+def random_guid():
+    return '%040x' % random.getrandbits(160)
+
+
+def close_guid(guid, bits):
+    """ A GUID sharing all but the last `bits` bits with `guid` """
+    return '%040x' % (long(guid, 16) ^ random.getrandbits(bits))
+
+
+def run(table_class, parent, guids):
+    table = table_class(parent, 1)
+    contacts = [Contact(guid) for guid in guids]
+
+    start = time.time()
+    for contact in contacts:
+        table.addContact(contact)
+    add_time = time.time() - start
+
+    start = time.time()
+    for guid in guids:
+        table.getContact(guid)
+    get_time = time.time() - start
+
+    return len(table.buckets), add_time / len(guids), get_time / len(guids)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--contacts', type=int, default=10000)
+    args = parser.parse_args()
+
+    parent = random_guid()
+    # Contacts at every distance from us, so that the buckets keep splitting
+    guids = [close_guid(parent, random.randrange(1, 161))
+             for _ in xrange(args.contacts)]
+
+    print 'contacts: %d' % args.contacts
+    for name, table_class in (
+            ('linear scan', LinearScanRoutingTable),
+            ('bisect', routingtable.OptimizedTreeRoutingTable)):
+        buckets, add, get = run(table_class, parent, guids)
+        print '%-12s buckets: %d, add: %.1f us, get: %.1f us' % (
+            name, buckets, add * 1e6, get * 1e6)
+
+
+if __name__ == '__main__':
+    main()
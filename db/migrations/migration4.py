@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+from pysqlcipher import dbapi2 as sqlite
+import sys
+
+from node import constants
+
+DB_PATH = constants.DB_PATH
+
+
+def upgrade(db_path):
+
+    con = sqlite.connect(db_path)
+    with con:
+        cur = con.cursor()
+
+        # Use PRAGMA key to encrypt / decrypt database.
+        cur.execute("PRAGMA key = 'passphrase';")
+
+        try:
+            # Keep only the newest row for each key before enforcing
+            # uniqueness; the datastore upserts against this index.
+            cur.execute("DELETE FROM datastore WHERE id NOT IN "
+                        "(SELECT MAX(id) FROM datastore "
+                        "GROUP BY key, market_id)")
+            cur.execute("CREATE UNIQUE INDEX datastore_key_market_id "
+                        "ON datastore(key, market_id)")
+            print 'Upgraded'
+            con.commit()
+        except sqlite.Error as e:
+            print 'Exception: %s' % e
+
+
+def downgrade(db_path):
+
+    con = sqlite.connect(db_path)
+    with con:
+        cur = con.cursor()
+
+        # Use PRAGMA key to encrypt / decrypt database.
+        cur.execute("PRAGMA key = 'passphrase';")
+
+        cur.execute("DROP INDEX IF EXISTS datastore_key_market_id")
+
+        print 'Downgraded'
+        con.commit()
+
+if __name__ == "__main__":
+
+    if sys.argv[1:] is not None:
+        DB_PATH = sys.argv[1:][0]
+        if sys.argv[2:] is "downgrade":
+            downgrade(DB_PATH)
+        else:
+            upgrade(DB_PATH)
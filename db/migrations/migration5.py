@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+from pysqlcipher import dbapi2 as sqlite
+import sys
+
+from node import constants
+
+DB_PATH = constants.DB_PATH
+
+INDEXES = [
+    ("orders_order_id", "orders(order_id)"),
+    ("orders_buyer_order_id", "orders(buyer_order_id)"),
+    ("orders_market_id_updated", "orders(market_id, updated)"),
+    ("peers_guid", "peers(guid)"),
+    ("peers_uri", "peers(uri)"),
+    ("contracts_market_id_deleted", "contracts(market_id, deleted)")
+]
+
+
+def upgrade(db_path):
+
+    con = sqlite.connect(db_path)
+    with con:
+        cur = con.cursor()
+
+        # Use PRAGMA key to encrypt / decrypt database.
+        cur.execute("PRAGMA key = 'passphrase';")
+
+        try:
+            for name, columns in INDEXES:
+                cur.execute("CREATE INDEX IF NOT EXISTS %s ON %s"
+                            % (name, columns))
+            print 'Upgraded'
+            con.commit()
+        except sqlite.Error as e:
+            print 'Exception: %s' % e
+
+
+def downgrade(db_path):
+
+    con = sqlite.connect(db_path)
+    with con:
+        cur = con.cursor()
+
+        # Use PRAGMA key to encrypt / decrypt database.
+        cur.execute("PRAGMA key = 'passphrase';")
+
+        for name, _ in INDEXES:
+            cur.execute("DROP INDEX IF EXISTS %s" % name)
+
+        print 'Downgraded'
+        con.commit()
+
+if __name__ == "__main__":
+
+    if sys.argv[1:] is not None:
+        DB_PATH = sys.argv[1:][0]
+        if sys.argv[2:] is "downgrade":
+            downgrade(DB_PATH)
+        else:
+            upgrade(DB_PATH)
@@ -0,0 +1,165 @@
+from collections import deque
+from functools import partial
+import logging
+import threading
+import time
+
+from zmq.eventloop import ioloop
+
+import constants
+
+
+class Bootstrap(object):
+    """
+    Connects a node to the network by dialing the peers it knows of.
+
+    Peers are dialed in the order given, which should be from the most to
+    the least promising, with at most `concurrency` handshakes in flight.
+    Dialing stops once the routing table holds `target` contacts or every
+    peer has been tried, and the time it took to get the first `first_k`
+    contacts is recorded.
+    """
+
+    def __init__(self, transport, uris, concurrency=None, target=None,
+                 first_k=None, dial_timeout=None, callback=None,
+                 io_loop=None):
+        """
+        @param uris: The peers to dial, best first; duplicates are ignored.
+        @type uris: list
+        @param callback: Called with stats() once bootstrapping is over.
+        """
+        self.transport = transport
+        self.concurrency = concurrency or constants.bootstrapConcurrency
+        self.target = target or constants.bootstrapTargetPeers
+        self.first_k = first_k or constants.bootstrapFirstK
+        self.dial_timeout = dial_timeout or constants.bootstrapDialTimeout
+        self.callback = callback
+        self._io_loop = io_loop or ioloop.IOLoop.instance()
+
+        self._queue = deque()
+        seen = set()
+        for uri in uris:
+            if uri not in seen:
+                seen.add(uri)
+                self._queue.append(uri)
+
+        self._lock = threading.Lock()
+        self._dialing = set()
+        self._finished = False
+        self._started_at = None
+        self._succeeded = 0
+        self._failed = 0
+        self.time_to_first_k = None
+
+        self.log = logging.getLogger(
+            '[%s] %s' % (transport.market_id, self.__class__.__name__)
+        )
+
+    def start(self):
+        self.log.info('Bootstrapping from %d peers' % len(self._queue))
+        self._started_at = time.time()
+        self._dial_next()
+
+    def _routing_table_size(self):
+        return sum(
+            len(bucket) for bucket in self.transport.dht.routingTable.buckets
+        )
+
+    def _dial_next(self):
+        with self._lock:
+            if self._finished:
+                return
+            uris = []
+            while self._queue and \
+                    len(self._dialing) < self.concurrency:
+                uri = self._queue.popleft()
+                self._dialing.add(uri)
+                uris.append(uri)
+            done = not self._dialing
+
+        if done:
+            self._finish()
+            return
+
+        for uri in uris:
+            self.transport.worker_pool.submit(self._dial, uri)
+
+    def _dial(self, uri):
+        if self.transport.dht.activePeers.get_by_uri(uri) is not None:
+            self._dialed(uri, True)
+            return
+
+        # Don't wait for a handshake timeout from peers known to be down
+        peer = self.transport.get_crypto_peer(uri=uri)
+        if peer is None or not peer.is_reachable():
+            self._dialed(uri, False)
+            return
+
+        def handshake_cb():
+            self.transport.save_peer_to_db(
+                (peer.address, peer.pub, peer.guid, peer.nickname)
+            )
+            self.transport.dht.add_known_node(
+                peer.address, peer.guid, peer.nickname, peer.pub
+            )
+            self._dialed(uri, True)
+
+        # Unreachable peers never answer; give up on them after a while
+        self._io_loop.add_callback(
+            self._io_loop.add_timeout,
+            time.time() + self.dial_timeout,
+            partial(self._dialed, uri, False)
+        )
+        peer.start_handshake(handshake_cb)
+
+    def _dialed(self, uri, success):
+        with self._lock:
+            if uri not in self._dialing:
+                # Already timed out, or answered before timing out
+                return
+            self._dialing.discard(uri)
+            if success:
+                self._succeeded += 1
+            else:
+                self._failed += 1
+                self.log.debug('Could not bootstrap from %s' % uri)
+
+        size = self._routing_table_size()
+        if self.time_to_first_k is None and size >= self.first_k:
+            self.time_to_first_k = time.time() - self._started_at
+            self.log.info('Connected to %d peers in %.2fs' %
+                          (size, self.time_to_first_k))
+
+        if size >= self.target:
+            self._finish()
+        else:
+            self._dial_next()
+
+    def _finish(self):
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+
+        stats = self.stats()
+        self.log.info('Bootstrap finished: %s' % stats)
+        if self.callback is not None:
+            self.callback(stats)
+
+    def stats(self):
+        """
+        @return: Progress of the bootstrap: peers dialed successfully or
+                 not, peers left untried, size of the routing table and
+                 seconds to reach first_k contacts (None until then).
+        @rtype: dict
+        """
+        with self._lock:
+            return {
+                'succeeded': self._succeeded,
+                'failed': self._failed,
+                'dialing': len(self._dialing),
+                'remaining': len(self._queue),
+                'routing_table_size': self._routing_table_size(),
+                'time_to_first_k': self.time_to_first_k,
+                'finished': self._finished
+            }
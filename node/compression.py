@@ -0,0 +1,67 @@
+import zlib
+
+import constants
+
+# Every zlib stream produced with the default window size starts with this
+# byte, while the uncompressed payloads are JSON objects starting with '{'.
+# The first byte of a message therefore tells whether it is compressed.
+# Older peers inflate every message they receive though, so uncompressed
+# payloads are only sent to peers that advertise the 'plain' capability.
+ZLIB_HEADER = '\x78'
+
+CAPABILITY = 'plain'
+
+
+def compress(data, level=None, min_size=None, plain=True):
+    """
+    Compress a serialized message according to the compression policy.
+
+    Messages shorter than `min_size` are sent as is, as are messages that
+    zlib does not make any smaller, unless `plain` is False.
+
+    @param data: The serialized (JSON) message.
+    @type data: str
+    @param level: zlib compression level, 0 disables compression.
+                  Defaults to constants.compressionLevel.
+    @type level: int
+    @param min_size: Smallest message worth compressing [bytes].
+                     Defaults to constants.compressionMinSize.
+    @type min_size: int
+    @param plain: Whether the receiving peer accepts uncompressed payloads;
+                  if not, a zlib stream is always returned.
+    @type plain: bool
+    @return: The payload to put on the wire.
+    @rtype: str
+    """
+    if level is None:
+        level = constants.compressionLevel
+    if min_size is None:
+        min_size = constants.compressionMinSize
+
+    if not plain:
+        return zlib.compress(data, max(level, 0))
+
+    if level <= 0 or len(data) < min_size:
+        return data
+
+    compressed = zlib.compress(data, level)
+    if len(compressed) >= len(data):
+        return data
+    return compressed
+
+
+def is_compressed(data):
+    return data[:1] == ZLIB_HEADER
+
+
+def decompress(data):
+    """
+    Undo compress(): payloads starting with the zlib header are inflated,
+    anything else is returned unchanged.
+    """
+    if is_compressed(data):
+        try:
+            return zlib.decompress(data)
+        except zlib.error:
+            pass
+    return data
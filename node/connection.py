@@ -1,19 +1,25 @@
 from pprint import pformat
 from urlparse import urlparse
+from functools import partial
 from zmq.eventloop import ioloop, zmqstream
 from zmq.error import ZMQError
 import logging
 import pyelliptic as ec
 import socket
-import zlib
+import threading
 import obelisk
 import zmq
 import errno
+import itertools
 import json
+import compression
+import constants
+import envelope
 import network_util
 import platform
-from crypto_util import (makePubCryptor, hexToPubkey, makePrivCryptor,
-    pubkey_to_pyelliptic)
+import session_crypto
+import time
+from crypto_util import getPubCryptor, getPrivCryptor, pubkey_to_pyelliptic
 
 ioloop.install()
 
@@ -27,7 +33,21 @@ class PeerConnection(object):
         self.nickname = nickname
         self.responses_received = {}
 
-        self.ctx = zmq.Context()
+        # Compression policy for outgoing messages
+        self.compression_level = constants.compressionLevel
+        self.compression_min_size = constants.compressionMinSize
+        # Older peers can only read zlib streams
+        self.supports_uncompressed = False
+
+        # One context (and its I/O threads) is shared by the whole process
+        self.ctx = zmq.Context.instance()
+        self._io_loop = ioloop.IOLoop.current()
+
+        # Persistent socket to the peer and the requests awaiting a response
+        self._stream = None
+        self._stream_address = None
+        self._pending = {}
+        self._request_ids = itertools.count()
 
         self.log = logging.getLogger(
             '[%s] %s' % (self.transport.market_id, self.__class__.__name__)
@@ -35,7 +55,7 @@ class PeerConnection(object):
 
     def create_zmq_socket(self):
         try:
-            socket = self.ctx.socket(zmq.REQ)
+            socket = self.ctx.socket(zmq.DEALER)
             socket.setsockopt(zmq.LINGER, 0)
             return socket
         except Exception as e:
@@ -44,49 +64,126 @@ class PeerConnection(object):
         # self._socket.setsockopt(zmq.SOCKS_PROXY, "127.0.0.1:9051");
 
     def cleanup_context(self):
-        self.ctx.destroy()
-
-    def send(self, data, callback):
-        self.send_raw(json.dumps(data), callback)
-
-    def send_raw(self, serialized, callback=lambda msg: None):
-
-        compressed_data = zlib.compress(serialized, 9)
-
-        try:
+        """ Close the socket to this peer. The shared context stays up. """
+        self._io_loop.add_callback(self._close_stream)
+
+    def _get_stream(self):
+        """ Returns the stream connected to this peer, opening it on first
+        use or when the peer address changed.
+        Must be called from the IOLoop thread.
+        """
+        if self._stream is not None and self._stream_address != self.address:
+            self._close_stream()
+
+        if self._stream is None:
             s = self.create_zmq_socket()
             try:
                 s.connect(self.address)
             except zmq.ZMQError as e:
                 if e.errno != errno.EINVAL:
+                    s.close()
                     raise
                 s.ipv6 = True
                 s.connect(self.address)
 
-            stream = zmqstream.ZMQStream(s, io_loop=ioloop.IOLoop.current())
-            stream.send(compressed_data)
+            self._stream = zmqstream.ZMQStream(s, io_loop=self._io_loop)
+            self._stream.on_recv(self._on_response)
+            self._stream_address = self.address
 
-            def cb(stream, msg):
-                response = json.loads(msg[0])
-                self.log.debug('[send_raw] %s' % pformat(response))
+        return self._stream
 
-                # Update active peer info
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+            self._stream_address = None
 
-                if 'senderNick' in response and\
-                   response['senderNick'] != self.nickname:
-                    self.nickname = response['senderNick']
+        # Responses to requests sent on the old socket will never arrive
+        for _, timeout in self._pending.values():
+            self._io_loop.remove_timeout(timeout)
+        self._pending.clear()
 
-                if callback is not None:
-                    self.log.debug('%s' % msg)
-                    callback(msg)
-                stream.close()
+    def send(self, data, callback):
+        self.send_raw(json.dumps(data), callback)
+
+    def send_raw(self, serialized, callback=lambda msg: None, compress=True):
+
+        if compress:
+            compressed_data = compression.compress(
+                serialized,
+                self.compression_level,
+                self.compression_min_size,
+                self.supports_uncompressed
+            )
+        else:
+            compressed_data = serialized
 
-            stream.on_recv_stream(cb)
+        # ZMQ sockets are not thread safe and send_raw is called from worker
+        # threads, so the socket is only ever touched from the IOLoop.
+        self._io_loop.add_callback(
+            self._send_on_loop, compressed_data, callback
+        )
+
+    def _send_on_loop(self, data, callback):
+        try:
+            stream = self._get_stream()
         except Exception as e:
-            self.log.error(e)
-            # Shouldn't we raise the exception here?
-            # I think not doing this could cause buggy behavior on top.
-            raise
+            self.log.error('Cannot connect to %s: %s' % (self.address, e))
+            return
+
+        request_id = str(next(self._request_ids))
+        timeout = self._io_loop.add_timeout(
+            time.time() + self.timeout,
+            partial(self._on_request_timeout, request_id)
+        )
+        self._pending[request_id] = (callback, timeout)
+
+        # The REP listener sends every frame up to the empty delimiter back
+        # with its reply, which lets us match responses to requests.
+        stream.send_multipart([request_id, '', data])
+
+    def _on_response(self, frames):
+        if len(frames) != 3 or frames[1] != '':
+            self.log.error('Malformed response from %s' % self.address)
+            return
+
+        request_id, _, msg = frames
+        response = json.loads(msg)
+        self._peer_responded(response)
+
+        pending = self._pending.pop(request_id, None)
+        if pending is None:
+            self.log.debug('Dropping late response from %s' % self.address)
+            return
+
+        callback, timeout = pending
+        self._io_loop.remove_timeout(timeout)
+
+        self.log.debug('[send_raw] %s' % pformat(response))
+
+        # Update active peer info
+
+        if 'senderNick' in response and\
+           response['senderNick'] != self.nickname:
+            self.nickname = response['senderNick']
+
+        if callback is not None:
+            self.log.debug('%s' % msg)
+            callback([msg])
+
+    def _on_request_timeout(self, request_id):
+        if self._pending.pop(request_id, None) is not None:
+            self.log.debug('No response from %s after %ss' %
+                           (self.address, self.timeout))
+            self._peer_timed_out()
+
+    def _peer_responded(self, response):
+        """ Called on the IOLoop when the peer answers a request """
+        pass
+
+    def _peer_timed_out(self):
+        """ Called on the IOLoop when a request to the peer times out """
+        pass
 
 
 class CryptoPeerConnection(PeerConnection):
@@ -107,8 +204,36 @@ class CryptoPeerConnection(PeerConnection):
         self.guid = guid
         self.address = "tcp://%s:%s" % (self.ip, self.port)
 
+        # Reachability cache: None until known, then the result of the last
+        # probe or request and when it was recorded
+        self._reachable = None
+        self._reachable_checked_at = 0
+        self._reachability_probe_pending = False
+        self._reachability_lock = threading.Lock()
+
+        # Symmetric session and binary envelopes, used once the peer has
+        # advertised support
+        self.supports_sessions = False
+        self.supports_binary_envelope = False
+        self._session = None
+        self._session_lock = threading.Lock()
+
         PeerConnection.__init__(self, transport, address, nickname)
 
+    @property
+    def guid(self):
+        return self._guid
+
+    @guid.setter
+    def guid(self, guid):
+        self._guid = guid
+        # Integer value of the node ID, computed once for all the routing
+        # table and distance calculations
+        try:
+            self.guid_long = long(guid, 16)
+        except (TypeError, ValueError):
+            self.guid_long = None
+
     def __eq__(self, other):
         if isinstance(other, self.__class__):
             return self.guid == other.guid
@@ -118,8 +243,8 @@ class CryptoPeerConnection(PeerConnection):
 
     def start_handshake(self, handshake_cb=None):
 
-        if self.check_port():
-            def cb(msg, handshake_cb=None):
+        if self.is_reachable():
+            def cb(msg):
                 if msg:
 
                     self.log.debug('ALIVE PEER %s' % msg[0])
@@ -134,21 +259,18 @@ class CryptoPeerConnection(PeerConnection):
 
                     self._peer_alive = True
 
-                    # Add this peer to active peers list
-                    for idx, peer in enumerate(self.transport.dht.activePeers):
-                        if peer.guid == self.guid or peer.address == self.address:
-                            self.transport.dht.activePeers[idx] = self
-                            self.transport.dht.add_peer(
-                                self.transport,
-                                self.address,
-                                self.pub,
-                                self.guid,
-                                self.nickname
-                            )
-                            return
-
-                    self.transport.dht.activePeers.append(self)
-                    self.transport.dht.routingTable.addContact(self)
+                    # Add this peer to active peers list, replacing any
+                    # peer with the same GUID or address
+                    if self.transport.dht.activePeers.add(self):
+                        self.transport.dht.add_peer(
+                            self.transport,
+                            self.address,
+                            self.pub,
+                            self.guid,
+                            self.nickname
+                        )
+                    else:
+                        self.transport.dht.routingTable.addContact(self)
 
                     if handshake_cb is not None:
                         handshake_cb()
@@ -164,7 +286,7 @@ class CryptoPeerConnection(PeerConnection):
                 cb
             )
         else:
-            self.log.error('CryptoPeerConnection.check_port() failed.')
+            self.log.error('Peer %s is not reachable.' % self.address)
 
     def __repr__(self):
         return '{ guid: %s, ip: %s, port: %s, pubkey: %s }' % (
@@ -175,7 +297,58 @@ class CryptoPeerConnection(PeerConnection):
     def generate_sin(guid):
         return obelisk.EncodeBase58Check('\x0F\x02%s' + guid.decode('hex'))
 
+    def is_reachable(self):
+        """ Non-blocking reachability check backed by a per peer cache.
+
+        Peers are assumed reachable until proven otherwise. When the cached
+        result is missing or older than constants.peerReachabilityTTL the
+        peer is probed again on the probe pool of the transport, so the
+        result of this call never waits on a TCP connect.
+
+        @rtype: bool
+        """
+        with self._reachability_lock:
+            reachable = self._reachable
+            stale = (time.time() - self._reachable_checked_at >
+                     constants.peerReachabilityTTL)
+        if reachable is None or stale:
+            self._schedule_reachability_probe()
+        return reachable is not False
+
+    def _set_reachable(self, reachable):
+        with self._reachability_lock:
+            self._reachable = reachable
+            self._reachable_checked_at = time.time()
+
+    def _schedule_reachability_probe(self):
+        with self._reachability_lock:
+            if self._reachability_probe_pending:
+                return
+            self._reachability_probe_pending = True
+        self.transport.probe_pool.submit(self._probe_reachability)
+
+    def _probe_reachability(self):
+        try:
+            self._set_reachable(self.check_port())
+        finally:
+            with self._reachability_lock:
+                self._reachability_probe_pending = False
+
+    def _peer_responded(self, response):
+        self._set_reachable(True)
+        capabilities = response.get('capabilities', ())
+        self.supports_sessions = session_crypto.CAPABILITY in capabilities
+        self.supports_binary_envelope = envelope.CAPABILITY in capabilities
+        self.supports_uncompressed = compression.CAPABILITY in capabilities
+
+    def _peer_timed_out(self):
+        # Don't wait for the TTL to find out whether the peer went away
+        self._schedule_reachability_probe()
+
     def check_port(self):
+        """ Blocking TCP probe of the peer; only run it off the IOLoop,
+        is_reachable() schedules it on the worker pool.
+        """
 
         try:
             s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -198,25 +371,50 @@ class CryptoPeerConnection(PeerConnection):
         return True
 
     def sign(self, data):
-        cryptor = makePrivCryptor(self.transport.settings['secret'])
+        cryptor = getPrivCryptor(self.transport.settings['secret'])
         return cryptor.sign(data)
 
     def encrypt(self, data):
         try:
             if self.pub is not None:
-                hexkey = hexToPubkey(self.pub)
-                return ec.ECC.encrypt(data, hexkey)
+                cryptor = getPubCryptor(self.pub)
+                return ec.ECC.encrypt(data, cryptor.get_pubkey())
             else:
                 self.log.error('Public Key is missing')
                 return False
         except Exception as e:
             self.log.error('Encryption failed. %s' % e)
 
+    def get_session(self):
+        """
+        Returns the session to encrypt messages to this peer with, starting
+        a new one when needed, or None to fall back to per message ECIES.
+        """
+        if not (constants.sessionEncryption and self.supports_sessions and
+                self.pub):
+            return None
+
+        with self._session_lock:
+            session = self._session
+            if session is None or session.expired() or \
+               session.peer_pubkey != self.pub:
+                try:
+                    session = session_crypto.OutboundSession(
+                        getPrivCryptor(self.transport.settings['secret']),
+                        self.transport.pubkey,
+                        self.pub
+                    )
+                except Exception as e:
+                    self.log.error('Could not start a session: %s' % e)
+                    return None
+                self._session = session
+        return session
+
     def send(self, data, callback=lambda msg: None):
 
         if hasattr(self, 'guid'):
 
-            if self.check_port():
+            if self.is_reachable():
 
                 # Include guid
                 data['guid'] = self.guid
@@ -229,20 +427,37 @@ class CryptoPeerConnection(PeerConnection):
                     'Sending to peer: %s %s' % (self.ip, pformat(data))
                 )
 
+                serialized = json.dumps(data)
+                session = self.get_session()
+
+                # Binary envelopes only hold ciphertext, which doesn't
+                # compress; JSON ones are hex encoded and do.
+                binary = (constants.binaryEnvelope and
+                          self.supports_binary_envelope)
+
                 if self.pub == '':
                     self.log.info('There is no public key for encryption')
+                elif session is not None:
+                    self.send_raw(
+                        envelope.encode(envelope.SESSION,
+                                        session.seal(serialized), binary),
+                        callback,
+                        compress=not binary
+                    )
                 else:
-                    signature = self.sign(json.dumps(data))
-                    data = self.encrypt(json.dumps(data))
+                    signature = self.sign(serialized)
+                    data = self.encrypt(serialized)
 
                     try:
                         if data is not None:
                             self.send_raw(
-                                json.dumps({
-                                    'sig': signature.encode('hex'),
-                                    'data': data.encode('hex')
-                                }),
-                                callback
+                                envelope.encode(
+                                    envelope.ECIES,
+                                    {'sig': signature, 'data': data},
+                                    binary
+                                ),
+                                callback,
+                                compress=not binary
                             )
                         else:
                             self.log.error('Data was empty')
@@ -293,7 +508,7 @@ class PeerListener(object):
 
     def listen(self):
         self.log.info("Listening at: %s:%s" % (self.ip, self.port))
-        self.ctx = zmq.Context()
+        self.ctx = zmq.Context.instance()
         self.socket = self.ctx.socket(zmq.REP)
 
         if network_util.is_loopback_addr(self.ip):
@@ -329,18 +544,24 @@ class PeerListener(object):
             self.socket, io_loop=ioloop.IOLoop.current()
         )
 
-        def handle_recv(messages):
+        self.is_listening = True
+
+        self.stream.on_recv(self._handle_recv)
+
+    def _handle_recv(self, messages):
+        # The REP socket can't receive again before it replied, so a
+        # message that can't be handled must not keep the reply from going
+        try:
             #FIXME: investigate if we really get more than one messages here
             for msg in messages:
-                self._on_raw_message(msg)
-
+                try:
+                    self._on_raw_message(msg)
+                except Exception as e:
+                    self.log.error('Could not handle message: %s' % e)
+        finally:
             if self._ok_msg:
                 self.stream.send(json.dumps(self._ok_msg))
 
-        self.is_listening = True
-
-        self.stream.on_recv(handle_recv)
-
     def _on_raw_message(self, serialized):
         self.log.info("connected %d", len(serialized))
         try:
@@ -352,9 +573,9 @@ class PeerListener(object):
         self._data_cb(msg)
 
     def stop(self):
-        if self.ctx:
-            print "PeerListener.stop() destroying zmq socket."
-            self.ctx.destroy(linger=None)
+        if self.stream:
+            print "PeerListener.stop() closing zmq socket."
+            self.stream.close()
             self.is_listening = False
 
 class CryptoPeerListener(PeerListener):
@@ -375,21 +596,53 @@ class CryptoPeerListener(PeerListener):
             curve='secp256k1'
         )
 
+        # Sessions opened by peers, by session id
+        self._sessions = session_crypto.InboundSessions(
+            constants.sessionCacheSize, constants.retiredSessionCacheSize
+        )
+
+    def _open_session_message(self, msg):
+        """ Returns the message sealed in a session envelope, or None """
+        try:
+            data, sender_pubkey = session_crypto.open_envelope(
+                msg, getPrivCryptor(self.secret), self._sessions
+            )
+            data_json = json.loads(data)
+        except (session_crypto.SessionError, ValueError) as e:
+            self.log.error('Could not open session message: %s' % e)
+            return None
+
+        if not isinstance(data_json, dict):
+            self.log.error('Session message is not an object')
+            return None
+
+        if data_json.get('pubkey') != sender_pubkey:
+            self.log.error('Session message from another key %s' % data_json)
+            return None
+
+        self.log.debug('Message Data %s ' % data_json)
+        return data_json
+
     def _on_raw_message(self, serialized):
         try:
-            # Decompress message
-            serialized = zlib.decompress(serialized)
+            # Decompress message, small ones are sent as is
+            serialized = compression.decompress(serialized)
 
-            msg = json.loads(serialized)
+            kind, msg = envelope.decode(serialized)
             self.log.info("Message Received [%s]" % msg.get('type', 'unknown'))
 
-            if msg.get('type') is None:
+            if kind == envelope.SESSION:
+                msg = self._open_session_message(msg)
+                if msg is None:
+                    return
+
+            elif kind == envelope.ECIES:
 
-                data = msg.get('data').decode('hex')
-                sig = msg.get('sig').decode('hex')
+                data = msg['data']
+                sig = msg['sig']
 
                 try:
-                    cryptor = makePrivCryptor(self.secret)
+                    cryptor = getPrivCryptor(self.secret)
 
                     try:
                         data = cryptor.decrypt(data)
@@ -401,14 +654,14 @@ class CryptoPeerListener(PeerListener):
 
                     # Check signature
                     data_json = json.loads(data)
-                    sigCryptor = makePubCryptor(data_json['pubkey'])
+                    sigCryptor = getPubCryptor(data_json['pubkey'])
                     if sigCryptor.verify(sig, data):
                         self.log.info('Verified')
                     else:
                         self.log.error('Message signature could not be verified %s' % msg)
                         # return
 
-                    msg = json.loads(data)
+                    msg = data_json
                     self.log.debug('Message Data %s ' % msg)
                 except Exception as e:
                     self.log.error('Could not decrypt message properly %s' % e)
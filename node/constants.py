@@ -44,4 +44,91 @@ checkRefreshInterval = refreshTimeout / 5
 # [bytes]
 udpDatagramMaxSize = 8192  # 8 KB
 
+# Number of threads shared by the transport, DHT and market for blocking
+# work (handshakes, sends, message callbacks)
+workerPoolSize = 16
+
+# Number of threads probing peer ports; kept apart from the worker pool, as a
+# probe of an unreachable peer blocks its thread for a while
+probePoolSize = 2
+
+# How long the result of a peer reachability probe is trusted before the
+# peer is probed again in the background
+# [seconds]
+peerReachabilityTTL = 60
+
+# zlib level used to compress outgoing messages; 0 disables compression
+compressionLevel = 1
+
+# Messages shorter than this are sent uncompressed, as compressing them
+# costs more CPU than it saves bytes
+# [bytes]
+compressionMinSize = 512
+
+# Number of peer public key cryptors kept by crypto_util
+pubCryptorCacheSize = 1000
+
+# Encrypt messages to peers that support it with a symmetric session key
+# instead of a new ECIES exchange per message
+sessionEncryption = True
+
+# Sessions are renewed after this long or this many messages
+# [seconds]
+sessionLifetime = 60 * 60  # 1 hour
+sessionMaxMessages = 2 ** 20
+
+# Number of out of order message counters accepted per session
+sessionReplayWindow = 64
+
+# Number of peer sessions kept by the listener, and of ids of the sessions
+# it dropped, whose messages are rejected from then on
+sessionCacheSize = 1000
+retiredSessionCacheSize = 10000
+
+# Use the compact binary envelope with peers that support it
+binaryEnvelope = True
+
+# Searches still running after this long are ended by the DHT, which checks
+# for them every searchReapInterval
+# [seconds]
+searchTTL = 60
+searchReapInterval = 10
+
+# How long a search waits for a node's findNode response before probing the
+# next node in its place; the response is still used if it comes later
+# [seconds]
+findNodeTimeout = 5
+
+# Nodes remembered by the DHT; the least recently seen are forgotten first,
+# and any not seen for knownNodeTTL
+# [seconds]
+knownNodesSize = 10000
+knownNodeTTL = 24 * 60 * 60
+
+# Interval at which peers saved by the transport are written to the database
+# [seconds]
+peerFlushInterval = 5
+
+# Bootstrapping dials the seeds and up to bootstrapPastPeers saved peers,
+# bootstrapConcurrency at a time, until the routing table holds
+# bootstrapTargetPeers contacts. The time to reach bootstrapFirstK contacts
+# is reported.
+bootstrapPastPeers = 200
+bootstrapConcurrency = 8
+bootstrapTargetPeers = 20
+bootstrapFirstK = 8
+
+# Dials without a handshake response by then are given up
+# [seconds]
+bootstrapDialTimeout = 10
+
+# Number of rows the SQLite-backed DHT datastore keeps cached in memory
+dataStoreCacheSize = 10000
+
+# Startup phases that are not needed to serve the web UI (joining the
+# network, Bitmessage, the Twisted reactor) run once the HTTP server
+# listens, which should take no longer than this
+# [seconds]
+startupListenTarget = 2
+
 DB_PATH = "db/ob.db"
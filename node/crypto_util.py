@@ -1,6 +1,18 @@
+import threading
+
 import pyelliptic as ec
 from pybitcointools import main as arithmetic
 
+import constants
+from util import LRUCache
+
+# Building a cryptor derives the public key in pure Python, so the cryptors
+# are kept around: the few private keys of this node for the lifetime of the
+# process and peer public keys in a bounded LRU.
+_priv_cryptors = {}
+_priv_cryptors_lock = threading.Lock()
+_pub_cryptors = LRUCache(constants.pubCryptorCacheSize)
+
 
 def pubkey_to_pyelliptic(pubkey):
     # Strip 04
@@ -30,6 +42,25 @@ def makePubCryptor(pubkey):
     return ec.ECC(curve='secp256k1', pubkey=pubkey_bin)
 
 
+def getPrivCryptor(privkey_hex):
+    """ Cached version of makePrivCryptor() """
+    with _priv_cryptors_lock:
+        cryptor = _priv_cryptors.get(privkey_hex)
+        if cryptor is None:
+            cryptor = makePrivCryptor(privkey_hex)
+            _priv_cryptors[privkey_hex] = cryptor
+    return cryptor
+
+
+def getPubCryptor(pubkey):
+    """ Cached version of makePubCryptor() """
+    cryptor = _pub_cryptors.get(pubkey)
+    if cryptor is None:
+        cryptor = makePubCryptor(pubkey)
+        _pub_cryptors.put(pubkey, cryptor)
+    return cryptor
+
+
 def hexToPubkey(pubkey):
     pubkey_raw = arithmetic.changebase(pubkey[2:], 16, 256, minlen=64)
     pubkey_bin = '\x02\xca\x00 ' + pubkey_raw[:32] + '\x00 ' + pubkey_raw[32:]
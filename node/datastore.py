@@ -1,6 +1,11 @@
 import UserDict
 import logging
 import ast
+import copy
+import threading
+
+import constants
+from util import LRUCache
 
 
 class DataStore(UserDict.DictMixin):
@@ -49,6 +54,15 @@ class DataStore(UserDict.DictMixin):
     def __delitem__(self, key):
         """ Delete the specified key (and its value) """
 
+    def iterRows(self):
+        """ Iterate in a single pass over every stored pair, yielding
+        C{(key, value, lastPublished, originallyPublished,
+        originalPublisherID)} tuples where C{key} is the key as it was
+        passed to C{setItem} """
+
+    def deleteKeys(self, keys):
+        """ Delete all the given keys (as yielded by C{iterRows}) at once """
+
 
 class DictDataStore(DataStore):
     """ A datastore using an in-memory Python dictionary """
@@ -109,6 +123,14 @@ class DictDataStore(DataStore):
         """ Delete the specified key (and its value) """
         del self.dict[key]
 
+    def iterRows(self):
+        for key, row in self.dict.items():
+            yield (key,) + row
+
+    def deleteKeys(self, keys):
+        for key in keys:
+            self.dict.pop(key, None)
+
 
 class MongoDataStore(DataStore):
     """ Example of a MongoDB database-based datastore
@@ -231,10 +253,26 @@ class MongoDataStore(DataStore):
 
 class SqliteDataStore(DataStore):
     """ Sqlite database-based datastore
+
+    Rows are kept in a bounded LRU cache (value and metadata together) and
+    writes go through to the database, so repeated lookups of the same key
+    are served from memory.
     """
-    def __init__(self, db_connection):
+    # Columns returned by _dbQuery, decoded once when a row is cached
+    _COLUMNS = ('value', 'lastPublished', 'originallyPublished',
+                'originalPublisherID')
+
+    # Marks a cache miss; a cached None means the key is not stored
+    _NOT_CACHED = object()
+
+    def __init__(self, db_connection, cache_size=constants.dataStoreCacheSize):
         self.db = db_connection
         self.log = logging.getLogger(self.__class__.__name__)
+        self._cache = LRUCache(cache_size)
+        self._write_lock = threading.Lock()
+        # Bumped by every write, so that a read that raced with one does
+        # not cache what it read
+        self._writes = 0
 
     def keys(self):
         """ Return a list of the keys in this data store """
@@ -272,39 +310,26 @@ class SqliteDataStore(DataStore):
 
     def setItem(self, key, value, lastPublished, originallyPublished, originalPublisherID, market_id=1):
 
-        rows = self.db.selectEntries(
-            "datastore",
-            {"key": key,
-             "market_id": market_id}
-        )
-        if len(rows) == 0:
-            self.db.insertEntry(
-                "datastore",
-                {
-                    'key': key,
-                    'value': value,
-                    'lastPublished': lastPublished,
-                    'originallyPublished': originallyPublished,
-                    'originalPublisherID': originalPublisherID,
-                    'market_id': market_id
-                }
-            )
-        else:
-            self.db.updateEntries(
-                "datastore",
-                {
-                    'key': key,
-                    'market_id': market_id
-                },
-                {
-                    'key': key,
-                    'value': value,
-                    'lastPublished': lastPublished,
-                    'originallyPublished': originallyPublished,
-                    'originalPublisherID': originalPublisherID,
-                    'market_id': market_id
-                }
-            )
+        row = {
+            'key': key,
+            'value': value,
+            'lastPublished': lastPublished,
+            'originallyPublished': originallyPublished,
+            'originalPublisherID': originalPublisherID,
+            'market_id': market_id
+        }
+
+        with self._write_lock:
+            # Relies on the UNIQUE (key, market_id) index to replace any
+            # existing row for this key in one statement
+            self.db.upsertEntry("datastore", row)
+            self._writes += 1
+
+            # Cache the row as it will read back from the database
+            self._cache.put(key, self._decodeRow(
+                dict((column, unicode(row[column]))
+                     for column in self._COLUMNS)
+            ))
 
         # if self._cursor.fetchone() is None:
         #     self._cursor.execute(
@@ -329,20 +354,68 @@ class SqliteDataStore(DataStore):
         #         )
         #     )
 
+    @staticmethod
+    def _decode(value):
+        try:
+            return ast.literal_eval(value)
+        except:
+            return value
+
+    def _decodeRow(self, row):
+        return dict((column, self._decode(row[column]))
+                    for column in self._COLUMNS)
+
+    def _row(self, key):
+        """ Return the decoded row stored under C{key} or None """
+        row = self._cache.get(key, self._NOT_CACHED)
+        if row is self._NOT_CACHED:
+            writes = self._writes
+            rows = self.db.selectEntries("datastore", {"key": key})
+            row = self._decodeRow(rows[0]) if rows else None
+            with self._write_lock:
+                # A write during the SELECT cached a newer row (or removed
+                # it); don't replace it with what may be stale
+                if writes == self._writes:
+                    self._cache.put(key, row)
+        return row
+
     def _dbQuery(self, key, columnName):
 
-        row = self.db.selectEntries("datastore", {"key": key})
+        row = self._row(key)
 
-        if len(row) != 0:
-            value = row[0][columnName]
-            try:
-                value = ast.literal_eval(value)
-            except:
-                pass
+        if row is not None:
+            value = row[columnName]
+            if isinstance(value, (dict, list)):
+                # Callers may modify what they get; keep the cache intact
+                value = copy.deepcopy(value)
             return value
 
     def __getitem__(self, key):
         return self._dbQuery(key, 'value')
 
     def __delitem__(self, key):
-        self.db.deleteEntries("datastore", {"key": key.encode("hex")})
+        with self._write_lock:
+            self.db.deleteEntries("datastore", {"key": key.encode("hex")})
+            self._writes += 1
+            self._cache.pop(key.encode("hex"))
+
+    def iterRows(self):
+        """ Stream every stored pair from a single cursor. Rows are not
+        added to the cache so a full sweep does not evict hot entries. """
+        for row in self.db.iterEntries("datastore", ['key'] + list(self._COLUMNS)):
+            decoded = self._decodeRow(row)
+            yield (row['key'],
+                   decoded['value'],
+                   decoded['lastPublished'],
+                   decoded['originallyPublished'],
+                   decoded['originalPublisherID'])
+
+    def deleteKeys(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        with self._write_lock:
+            self.db.deleteMany("datastore", "key", keys)
+            self._writes += 1
+            for key in keys:
+                self._cache.pop(key)
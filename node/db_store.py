@@ -1,41 +1,137 @@
 import logging
+import threading
+from contextlib import contextmanager
 from pysqlcipher import dbapi2 as sqlite
 
+# Adapters are registered module-wide, so do it once rather than per connection
+sqlite.register_adapter(bool, int)
+sqlite.register_converter("bool", lambda v: bool(int(v)))
+
 
 class Obdb(object):
     """ Interface for db storage. Serves as segregation of the persistence layer
     and the application logic
+
+    Connections are pooled per thread: the first query issued by a thread
+    opens and keys a connection which is then reused by every following
+    query of that thread until close() is called.
     """
     def __init__(self, db_path, disable_sqlite_crypt=False):
         self.db_path = db_path
-        self.con = False
         self.log = logging.getLogger('DB')
         self.disable_sqlite_crypt = disable_sqlite_crypt
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
 
     def _connectToDb(self):
-        """ Opens a db connection
+        """ Returns the db connection of the calling thread, opening it
+        on first use
         """
-        self.con = sqlite.connect(
-            self.db_path, detect_types=sqlite.PARSE_DECLTYPES
+        con = getattr(self._local, 'con', None)
+        if con is not None:
+            return con
+
+        con = sqlite.connect(
+            self.db_path,
+            detect_types=sqlite.PARSE_DECLTYPES,
+            check_same_thread=False
         )
-        sqlite.register_adapter(bool, int)
-        sqlite.register_converter("bool", lambda v: bool(int(v)))
-        self.con.row_factory = self._dictFactory
+        con.row_factory = self._dictFactory
 
         if not self.disable_sqlite_crypt:
             # Use PRAGMA key to encrypt / decrypt database.
-            cur = self.con.cursor()
+            cur = con.cursor()
             cur.execute("PRAGMA key = 'passphrase';")
 
+        self._local.con = con
+        with self._connections_lock:
+            self._pruneConnections()
+            self._connections.append((threading.current_thread(), con))
+        return con
+
+    def _pruneConnections(self):
+        """ Close the connections of threads that have already exited.
+        Must be called with the connections lock held.
+        """
+        alive = []
+        for thread, con in self._connections:
+            if thread.is_alive():
+                alive.append((thread, con))
+            else:
+                self._closeConnection(con)
+        self._connections = alive
+
+    @staticmethod
+    def _closeConnection(con):
+        try:
+            con.close()
+        except Exception:
+            pass
+
     def _disconnectFromDb(self):
-        """ Close the db connection
+        """ Close the db connection of the calling thread
+        """
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            return
+        self._local.con = None
+        with self._connections_lock:
+            self._connections = [
+                (thread, c) for thread, c in self._connections if c is not con
+            ]
+        self._closeConnection(con)
+
+    def close(self):
+        """ Close every pooled connection. Threads reconnect transparently
+        on their next query.
+        """
+        with self._connections_lock:
+            connections = self._connections
+            self._connections = []
+        for _, con in connections:
+            self._closeConnection(con)
+        self._local = threading.local()
+
+    def _inTransaction(self):
+        return getattr(self._local, 'transaction_depth', 0) > 0
+
+    @contextmanager
+    def _cursor(self):
+        """ Yields a cursor on the connection of the calling thread.
+        Statements are committed when the block exits, unless they run
+        inside a transaction() block which then commits them all at once.
+        """
+        con = self._connectToDb()
+        if self._inTransaction():
+            yield con.cursor()
+        else:
+            with con:
+                yield con.cursor()
+
+    @contextmanager
+    def transaction(self):
+        """ Run several operations as a single unit of work:
+
+            with db.transaction():
+                db.deleteEntries(...)
+                db.insertEntry(...)
+
+        Everything is committed together when the outermost block exits
+        and rolled back if it raises. Blocks may be nested; only the
+        outermost one commits.
         """
-        if self.con:
-            try:
-                self.con.close()
-            except Exception:
-                pass
-        self.con = False
+        con = self._connectToDb()
+        depth = getattr(self._local, 'transaction_depth', 0)
+        self._local.transaction_depth = depth + 1
+        try:
+            if depth:
+                yield self
+            else:
+                with con:
+                    yield self
+        finally:
+            self._local.transaction_depth = depth
 
     @staticmethod
     def _dictFactory(cursor, row):
@@ -75,9 +171,7 @@ class Obdb(object):
         @param whereDict: A dictionary with the WHERE clauses
         @param setDict: A dictionary with the SET clauses
         """
-        self._connectToDb()
-        with self.con:
-            cur = self.con.cursor()
+        with self._cursor() as cur:
             sets = []
             wheres = []
             where_part = []
@@ -105,16 +199,24 @@ class Obdb(object):
                     % (table, set_part, where_part)
             self.log.debug('query: %s' % query)
             cur.execute(query, tuple(sets + wheres))
-        self._disconnectFromDb()
 
     def insertEntry(self, table, update_dict):
         """ A wrapper for the SQL INSERT operation
         @param table: The table to search to
         @param updateDict: A dictionary with the values to set
         """
-        self._connectToDb()
-        with self.con:
-            cur = self.con.cursor()
+        return self._insert("INSERT", table, update_dict)
+
+    def upsertEntry(self, table, update_dict):
+        """ Insert a row, replacing any existing row that collides with it on
+        a UNIQUE constraint, in a single statement (INSERT OR REPLACE)
+        @param table: The table to write to
+        @param updateDict: A dictionary with the values to set
+        """
+        return self._insert("INSERT OR REPLACE", table, update_dict)
+
+    def _insert(self, verb, table, update_dict):
+        with self._cursor() as cur:
             sets = []
             updatefield_part = []
             setfield_part = []
@@ -128,15 +230,53 @@ class Obdb(object):
                 setfield_part.append("?")
             updatefield_part = ",".join(updatefield_part)
             setfield_part = ",".join(setfield_part)
-            query = "INSERT INTO %s(%s) VALUES(%s)"  \
-                    % (table, updatefield_part, setfield_part)
+            query = "%s INTO %s(%s) VALUES(%s)"  \
+                    % (verb, table, updatefield_part, setfield_part)
             cur.execute(query, tuple(sets))
             lastrowid = cur.lastrowid
             self.log.debug("query: %s " % query)
-        self._disconnectFromDb()
         if lastrowid:
             return lastrowid
 
+    def insertMany(self, table, rows):
+        """ Insert several rows in a single transaction
+        @param table: The table to insert into
+        @param rows: A list of dictionaries with the values to set
+        """
+        # Rows sharing the same columns are sent with one executemany call
+        batches = {}
+        order = []
+        for row in rows:
+            fields = tuple(sorted(row.keys()))
+            if fields not in batches:
+                batches[fields] = []
+                order.append(fields)
+            batches[fields].append(
+                tuple(self._beforeStoring(row[field]) for field in fields)
+            )
+
+        with self.transaction():
+            with self._cursor() as cur:
+                for fields in order:
+                    query = "INSERT INTO %s(%s) VALUES(%s)" % (
+                        table,
+                        ",".join(self._beforeStoring(f) for f in fields),
+                        ",".join("?" * len(fields))
+                    )
+                    self.log.debug("query: %s (x%d)" % (query,
+                                                       len(batches[fields])))
+                    cur.executemany(query, batches[fields])
+
+    def updateMany(self, table, updates, operator="AND"):
+        """ Run several UPDATE operations in a single transaction
+        @param table: The table to update
+        @param updates: A list of (where_dict, set_dict) tuples, with the
+                        same meaning as the arguments of updateEntries
+        """
+        with self.transaction():
+            for where_dict, set_dict in updates:
+                self.updateEntries(table, where_dict, set_dict, operator)
+
     def selectEntries(self, table, where_dict=None, operator="AND", order_field="id", order="ASC", limit=None, limit_offset=None, select_fields="*"):
         """
         A wrapper for the SQL SELECT operation. It will always return all the
@@ -144,12 +284,17 @@ class Obdb(object):
         @param table: The table to search
         @param whereDict: A dictionary with the WHERE clauses.
                           If ommited it will return all the rows of the table.
+        @param order_field: The column to sort the rows by, or a list of
+                            columns, all sorted in the `order` direction.
         """
         if where_dict is None:
             where_dict = {"\"1\"": "1"}
-        self._connectToDb()
-        with self.con:
-            cur = self.con.cursor()
+        if isinstance(order_field, basestring):
+            order_field = [order_field]
+        order_part = ", ".join(
+            "%s %s" % (field, order) for field in order_field
+        )
+        with self._cursor() as cur:
             wheres = []
             where_part = []
             for key, value in where_dict.iteritems():
@@ -169,14 +314,38 @@ class Obdb(object):
                     limit_clause = ""
             operator = " " + operator + " "
             where_part = operator.join(where_part)
-            query = "SELECT * FROM %s WHERE %s ORDER BY %s %s %s" \
-                    % (table, where_part, order_field, order, limit_clause)
+            query = "SELECT * FROM %s WHERE %s ORDER BY %s %s" \
+                    % (table, where_part, order_part, limit_clause)
             self.log.debug("query: %s " % query)
             cur.execute(query, tuple(wheres))
             rows = cur.fetchall()
-        self._disconnectFromDb()
         return rows
 
+    def iterEntries(self, table, select_fields="*", batch_size=500):
+        """
+        Iterate over all the rows of a table with a single cursor, fetching
+        them in batches instead of loading the whole table in memory.
+        @param table: The table to read
+        @param select_fields: A list of the columns to return, or "*"
+        @param batch_size: Number of rows fetched from the cursor at a time
+        """
+        if select_fields != "*":
+            select_fields = ",".join(select_fields)
+        query = "SELECT %s FROM %s ORDER BY id ASC" % (select_fields, table)
+        self.log.debug("query: %s " % query)
+
+        cur = self._connectToDb().cursor()
+        try:
+            cur.execute(query)
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row
+        finally:
+            cur.close()
+
     def deleteEntries(self, table, where_dict=None, operator="AND"):
         """
         A wrapper for the SQL DELETE operation. It will always return all the
@@ -188,9 +357,7 @@ class Obdb(object):
         if where_dict is None:
             where_dict = {"\"1\"": "1"}
 
-        self._connectToDb()
-        with self.con:
-            cur = self.con.cursor()
+        with self._cursor() as cur:
             dels = []
             where_part = []
             for key, value in where_dict.iteritems():
@@ -208,4 +375,23 @@ class Obdb(object):
                     % (table, where_part)
             self.log.debug('Query: %s' % query)
             cur.execute(query, dels)
-        self._disconnectFromDb()
+
+    def deleteMany(self, table, field, values):
+        """
+        Delete all the rows whose `field` is one of `values`, using
+        "WHERE field IN (...)" statements in a single transaction.
+        @param table: The table to delete from
+        @param field: The column to match
+        @param values: The values of `field` to delete
+        """
+        values = [self._beforeStoring(value) for value in values]
+        # Stay well below SQLite's limit of 999 bound parameters
+        chunk_size = 500
+        with self.transaction():
+            with self._cursor() as cur:
+                for start in xrange(0, len(values), chunk_size):
+                    chunk = values[start:start + chunk_size]
+                    query = "DELETE FROM %s WHERE %s IN (%s)" \
+                            % (table, field, ",".join("?" * len(chunk)))
+                    self.log.debug('Query: %s' % query)
+                    cur.execute(query, chunk)
@@ -1,15 +1,20 @@
+from functools import partial
 from protocol import proto_store
 from urlparse import urlparse
+from zmq.eventloop import ioloop
+import bisect
 import constants
 import datastore
 import hashlib
 import json
+import known_nodes
 import logging
 import os
+import peer_registry
 import routingtable
 import time
 import socket
-from threading import Thread
+import threading
 
 
 class DHT(object):
@@ -19,13 +24,26 @@ class DHT(object):
             '[%s] %s' % (market_id, self.__class__.__name__)
         )
         self.settings = settings
-        self.knownNodes = []
-        self.searches = []
+        self.knownNodes = known_nodes.KnownNodes()
+        self.searches = {}  # Searches in progress by findID
         self.search_keys = {}
-        self.activePeers = []
+        self.activePeers = peer_registry.PeerRegistry(market_id)
         self.republishThreads = []
         self.transport = transport
         self.market_id = market_id
+        self._io_loop = ioloop.IOLoop.current()
+
+        # Searches that never converge are dropped after a while
+        self._searchesLock = threading.Lock()
+        self._searchesStarted = 0
+        self._searchesCompleted = 0
+        self._searchesExpired = 0
+        self._searchReaper = ioloop.PeriodicCallback(
+            self._reapSearches,
+            constants.searchReapInterval * 1000,
+            self._io_loop
+        )
+        self._searchReaper.start()
 
         # Routing table
         self.routingTable = routingtable.OptimizedTreeRoutingTable(
@@ -35,6 +53,9 @@ class DHT(object):
     def getActivePeers(self):
         return self.activePeers
 
+    def shutdown(self):
+        self._searchReaper.stop()
+
     def start(self, seed_peer):
         """ This method executes only when the server is starting up for the
             first time and add the seed peer(s) to known node list and
@@ -45,7 +66,7 @@ class DHT(object):
         """
         ip = seed_peer.ip
         port = seed_peer.port
-        self.add_known_node(('tcp://%s:%s' % (ip, port), seed_peer.guid, seed_peer.nickname))
+        self.add_known_node('tcp://%s:%s' % (ip, port), seed_peer.guid, seed_peer.nickname)
 
         self.log.debug('Starting Seed Peer: %s' % seed_peer.nickname)
         self.add_peer(self.transport,
@@ -54,21 +75,20 @@ class DHT(object):
                       seed_peer.guid,
                       seed_peer.nickname)
 
-        self._iterativeFind(self.settings['guid'], self.knownNodes,
+        self._iterativeFind(self.settings['guid'], self.get_known_nodes(),
                             'findNode')
 
     def find_active_peer(self, uri, pubkey=None, guid=None, nickname=None):
-        found_peer = False
-        for peer in self.activePeers:
-            if (guid, uri, pubkey, nickname) == (peer.guid, peer.address, peer.pub, peer.nickname):
-                found_peer = peer
-        return found_peer
+        peer = self.activePeers.get_by_uri(uri)
+        if peer is not None and (guid, pubkey, nickname) == (peer.guid, peer.pub, peer.nickname):
+            return peer
+        return False
 
     def remove_active_peer(self, uri):
-        for idx, peer in enumerate(self.activePeers):
-            if uri == peer.address:
-                # self.activePeers[idx].cleanup_context()
-                del self.activePeers[idx]
+        peer = self.activePeers.get_by_uri(uri)
+        if peer is not None:
+            # peer.cleanup_context()
+            self.activePeers.remove(peer)
 
     def add_seed(self, transport, uri):
 
@@ -76,12 +96,11 @@ class DHT(object):
         self.log.debug(new_peer)
 
         def start_handshake_cb():
-            self.knownNodes.append(
-                (urlparse(uri).hostname, urlparse(uri).port, new_peer.guid)
-            )
-            self.log.debug('Known Nodes: %s' % self.knownNodes)
+            self.add_known_node(uri, new_peer.guid)
+            self.log.debug('Known Nodes: %s' % len(self.knownNodes))
 
-        Thread(target=new_peer.start_handshake, args=(start_handshake_cb,)).start()
+        self.transport.worker_pool.submit(new_peer.start_handshake,
+                                          start_handshake_cb)
 
     def add_peer(self, transport, uri, pubkey=None, guid=None, nickname=None):
         """ This takes a tuple (pubkey, URI, guid) and adds it to the active
@@ -96,7 +115,10 @@ class DHT(object):
 
         peer_tuple = (uri, pubkey, guid, nickname)
 
-        for idx, peer in enumerate(self.activePeers):
+        peer = self.activePeers.get_by_guid(guid) or \
+            self.activePeers.get_by_uri(uri)
+
+        if peer is not None:
             active_peer_tuple = (peer.address, peer.pub, peer.guid, peer.nickname)
 
             if active_peer_tuple == peer_tuple:
@@ -107,27 +129,28 @@ class DHT(object):
                     self.routingTable.removeContact(guid)
                     self.routingTable.addContact(peer)
                 return
-            else:
-                if peer.guid == guid or peer.address == uri:
 
-                    # Update peer
-                    peer.guid = guid
-                    peer.address = uri
-                    peer.pub = pubkey
-                    peer.nickname = nickname
-                    self.activePeers[idx] = peer
+            # Update peer, taking it out of the routing table under its old
+            # GUID first
+            if peer.guid and peer.guid != guid:
+                self.routingTable.removeContact(peer.guid)
+            peer.guid = guid
+            peer.address = uri
+            peer.pub = pubkey
+            peer.nickname = nickname
+            self.activePeers.add(peer)
 
-                    # Update routing table
-                    self.routingTable.removeContact(guid)
-                    self.routingTable.addContact(peer)
+            # Update routing table
+            self.routingTable.removeContact(guid)
+            self.routingTable.addContact(peer)
 
-                    return
+            return
 
-        if peer_tuple in self.knownNodes:
+        if self.knownNodes.is_known(uri, pubkey, guid, nickname):
             self.log.debug("This peer is already known and up to date")
             return
         else:
-            self.add_known_node(peer_tuple)
+            self.add_known_node(uri, guid, nickname, pubkey)
 
         # UNUSED
         # def timeout(peer=None):
@@ -148,25 +171,24 @@ class DHT(object):
             self.routingTable.removeContact(new_peer.guid)
             self.routingTable.addContact(new_peer)
             self.transport.save_peer_to_db(peer_tuple)
-            self.add_known_node((new_peer.address, new_peer.pub, new_peer.guid, new_peer.nickname))
+            self.add_known_node(new_peer.address, new_peer.guid, new_peer.nickname, new_peer.pub)
 
-        t = Thread(target=new_peer.start_handshake, args=(cb,))
-        t.start()
+        self.transport.worker_pool.submit(new_peer.start_handshake, cb)
 
-    def add_known_node(self, node):
-        """ Accept a peer tuple and add it to known nodes list
-        :param node: (tuple)
+    def add_known_node(self, uri, guid, nickname=None, pubkey=None):
+        """ Add a node to the known nodes, or refresh when it was last seen
+        :param uri: (str) address of the node
+        :param guid: (str) nodes without a GUID are ignored
         :return: N/A
         """
-        self.log.debug('Adding known node: %s' % str(node))
-        if node not in self.knownNodes and node[1] is not None:
-            self.knownNodes.append(node)
+        self.log.debug('Adding known node: %s %s %s' % (uri, guid, nickname))
+        self.knownNodes.add(uri, guid, nickname, pubkey)
 
     def get_known_nodes(self):
         """ Get known nodes list and return it
-        :return: (list)
+        :return: (list) of known_nodes.KnownNode
         """
-        return self.knownNodes
+        return list(self.knownNodes)
 
     def on_find_node(self, msg):
         """ When a findNode message is received it will be of several types:
@@ -257,24 +279,18 @@ class DHT(object):
         # localPeer = next((peer for peer in self.activePeers if peer.guid == msg['senderGUID']), None)
 
         # Update existing peer's pubkey if active peer
-        for idx, peer in enumerate(self.activePeers):
-            if peer.guid == msg['senderGUID']:
-                peer.nickname = msg['senderNick']
-                peer.pub = msg['pubkey']
-                self.activePeers[idx] = peer
+        peer = self.activePeers.get_by_guid(msg['senderGUID'])
+        if peer is not None:
+            peer.nickname = msg['senderNick']
+            peer.pub = msg['pubkey']
 
         # If key was found by this node then
         if 'foundKey' in msg.keys():
             self.log.debug('Found the key-value pair. Executing callback.')
 
-            for idx, s in enumerate(self.searches):
-                if s.findID == msg['findID']:
-                    s.callback(msg['foundKey'])
-                    if idx in self.searches:
-                        del self.searches[idx]
-                    # self.searches[msg['findID']].callback(msg['foundKey'])
-
-                    # Remove active search
+            search = self.searches.get(msg['findID'])
+            if search is not None:
+                self._finishSearch(search, msg['foundKey'])
 
         else:
 
@@ -290,37 +306,25 @@ class DHT(object):
                         foundNode.append('')
                     self.add_peer(self.transport, foundNode[1], foundNode[2], foundNode[0], foundNode[3])
 
-                for idx, search in enumerate(self.searches):
-                    if search.findID == msg['findID']:
-
-                        # Execute callback
-                        if search.callback is not None:
-                            search.callback((foundNode[2], foundNode[1], foundNode[0], foundNode[3]))
-
-                        # Clear search
-                        del self.searches[idx]
+                search = self.searches.get(msg['findID'])
+                if search is not None:
+                    self._finishSearch(
+                        search,
+                        (foundNode[2], foundNode[1], foundNode[0], foundNode[3])
+                    )
 
             else:
 
                 # Add any close nodes found to the shortlist
                 # self.extendShortlist(transport, msg['findID'], msg['foundNodes'])
 
-                foundSearch = False
-                search = ""
-                findID = msg['findID']
-                for s in self.searches:
-                    if s.findID == findID:
-                        search = s
-                        foundSearch = True
+                search = self.searches.get(msg['findID'])
 
-                if not foundSearch:
+                if search is None:
                     self.log.info('No search found')
                     return
                 else:
 
-                    # Get current shortlist length
-                    shortlist_length = len(search.shortlist)
-
                     nodes_to_extend = []
 
                     # Extends shortlist if necessary
@@ -334,28 +338,18 @@ class DHT(object):
                     self.extendShortlist(transport, msg['findID'], nodes_to_extend)
 
                     # Remove active probe to this node for this findID
-                    search_ip = urlparse(msg['uri']).hostname
-                    search_port = urlparse(msg['uri']).port
                     search_guid = msg['senderGUID']
-                    search_tuple = (search_ip, search_port, search_guid)
-                    for idx, probe in enumerate(search.active_probes):
-                        if probe == search_tuple:
-                            del search.active_probes[idx]
+                    self._endProbe(search, search_guid)
                     self.log.debug('Find Node Response - Active Probes After: %s' % search.active_probes)
 
                     # Add this to already contacted list
-                    if search_tuple not in search.already_contacted:
-                        search.already_contacted.append(search_tuple)
+                    with search.lock:
+                        search.already_contacted.add(search_guid)
                     self.log.debug('Already Contacted: %s' % search.already_contacted)
 
-                    # If we added more to shortlist then keep searching
-                    if len(search.shortlist) > shortlist_length:
-                        self.log.info('Lets keep searching')
-                        self._searchIteration(search)
-                    else:
-                        self.log.info('Shortlist is empty')
-                        if search.callback is not None:
-                            search.callback(search.shortlist)
+                    # Probe the next closest nodes, or finish the search
+                    # if it converged
+                    self._searchIteration(search)
 
     def _refreshNode(self):
         """ Periodically called to perform k-bucket refreshes and data
@@ -388,27 +382,33 @@ class DHT(object):
         """ Republishes and expires any stored data (i.e. stored
         C{(key, value pairs)} that need to be republished/expired
 
+        The datastore is read in a single pass; expired keys are then
+        deleted in bulk and the collected republishes are issued once the
+        sweep is over.
+
         This method should run in a deferred thread
         """
         self.log.debug('Republishing Data')
         expiredKeys = []
+        republish = []
+
+        now = int(time.time())
+        internalKey = 'nodeState'.encode('hex')
 
-        for key in self.dataStore.keys():
+        for key, value, lastPublished, originallyPublished, originalPublisherID \
+                in self.dataStore.iterRows():
 
             # Filter internal variables stored in the data store
-            if key == 'nodeState':
+            if key == internalKey:
                 continue
 
-            now = int(time.time())
-            key = key.encode('hex')
-            originalPublisherID = self.dataStore.originalPublisherID(key)
-            age = now - self.dataStore.originalPublishTime(key) + 500000
+            age = now - int(originallyPublished) + 500000
 
             if originalPublisherID == self.settings['guid']:
                 # This node is the original publisher; it has to republish
                 # the data before it expires (24 hours in basic Kademlia)
                 if age >= constants.dataExpireTimeout:
-                    self.iterativeStore(self.transport, key, self.dataStore[key])
+                    republish.append((key, value, None, 0))
 
             else:
                 # This node needs to replicate the data at set intervals,
@@ -418,23 +418,23 @@ class DHT(object):
                     # This key/value pair has expired (and it has not been republished by the original publishing node
                     # - remove it
                     expiredKeys.append(key)
-                elif now - self.dataStore.lastPublished(key) >= constants.replicateInterval:
-                    self.iterativeStore(self.transport, key, self.dataStore[key], originalPublisherID, age)
+                elif now - int(lastPublished) >= constants.replicateInterval:
+                    republish.append((key, value, originalPublisherID, age))
 
-        for key in expiredKeys:
-            del self.dataStore[key]
+        self.dataStore.deleteKeys(expiredKeys)
+
+        self.log.debug('Republishing %d keys, expired %d keys' %
+                       (len(republish), len(expiredKeys)))
+        for key, value, originalPublisherID, age in republish:
+            self.iterativeStore(self.transport, key, value, originalPublisherID, age)
 
     def extendShortlist(self, transport, findID, foundNodes):
 
         self.log.debug('foundNodes: %s' % foundNodes)
 
-        foundSearch = False
-        for s in self.searches:
-            if s.findID == findID:
-                search = s
-                foundSearch = True
+        search = self.searches.get(findID)
 
-        if not foundSearch:
+        if search is None:
             self.log.error('There was no search found for this ID')
             return
 
@@ -447,18 +447,12 @@ class DHT(object):
             node_port = urlparse(node_uri).port
 
             # Add to shortlist
-            if (node_ip, node_port, node_guid, node_nick) not in search.shortlist:
-                search.add_to_shortlist([(node_ip, node_port, node_guid, node_nick)])
+            search.add_to_shortlist([(node_ip, node_port, node_guid, node_nick)])
 
             # Skip ourselves if returned
             if node_guid == self.settings['guid']:
                 continue
 
-            for peer in self.activePeers:
-                if node_guid == peer.guid:
-                    # Already an active peer or it's myself
-                    continue
-
             if node_guid != self.settings['guid']:
                 self.log.debug('Adding new peer to active peers list: %s' % node)
                 self.add_peer(self.transport, node_uri, node_pubkey, node_guid, node_nick)
@@ -703,18 +697,27 @@ class DHT(object):
     def _iterativeFind(self, key, startupShortlist=None, call='findNode', callback=None):
         """
         - Create a new DHTSearch object and add the key and call back to it
-        - Add the search to our search queue (self.searches)
+        - Add the search to the searches in progress (self.searches)
         - Find out if we're looking for a value or for a node
         -
 
         """
+        # Keys come from the network and the UI; a key that isn't hex can't
+        # be compared to node IDs, so there is nothing to search for
+        try:
+            routingtable.RoutingTable.keyToLong(key)
+        except (TypeError, ValueError):
+            self.log.error('Cannot search for invalid key: %r' % (key,))
+            if callback is not None:
+                callback([])
+            return
+
         # Create a new search object
         self.log.debug('Startup short list: %s' % startupShortlist)
         new_search = DHTSearch(self.market_id, key, call, callback=callback)
-        self.searches.append(new_search)
-
-        # Determine if we're looking for a node or a key
-        findValue = True if call != 'findNode' else False
+        with self._searchesLock:
+            self.searches[new_search.findID] = new_search
+            self._searchesStarted += 1
 
         # If search is for your key abandon search
         # if not findValue and key == self.settings['guid']:
@@ -730,7 +733,7 @@ class DHT(object):
         if startupShortlist == [] or startupShortlist is None:
 
             # Retrieve closest nodes and add them to the shortlist for the search
-            closeNodes = self.routingTable.findCloseNodes(key, constants.alpha, self.settings['guid'])
+            closeNodes = self.routingTable.findCloseNodes(key, constants.k, self.settings['guid'])
             shortlist = []
 
             for closeNode in closeNodes:
@@ -746,113 +749,166 @@ class DHT(object):
             # Abandon the search if the shortlist has no nodes
             if len(new_search.shortlist) == 0:
                 self.log.info('Search Finished')
-                if callback is not None:
-                    callback([])
-                else:
-                    return []
+                self._finishSearch(new_search)
+                return []
 
         else:
             new_search.shortlist = startupShortlist
 
-        self._searchIteration(new_search, findValue=findValue)
-
-    def _searchIteration(self, new_search, findValue=False):
-
-        # Update slow nodes count
-        new_search.slowNodeCount[0] = len(new_search.active_probes)
-
-        # Sort shortlist from closest to farthest
-        # self.activePeers.sort(lambda firstContact, secondContact, targetKey=key: cmp(self.routingTable.distance(firstContact.guid,
-        # targetKey), self.routingTable.distance(secondContact.guid, targetKey)))
-        # new_search.shortlist.sort(lambda firstContact, secondContact, targetKey=key: cmp(self.routingTable.distance(firstContact.guid,
-        # targetKey), self.routingTable.distance(secondContact.guid, targetKey)))
-
-        self.activePeers.sort(lambda firstNode, secondNode, targetKey=new_search.key: cmp(
-            self.routingTable.distance(firstNode.guid, targetKey),
-            self.routingTable.distance(secondNode.guid, targetKey)))
-
-        # while len(self.pendingIterationCalls):
-        # del self.pendingIterationCalls[0]
-
-        # TODO: Put this in the callback
-        # if new_search.key in new_search.find_value_result:
-        # return new_search.find_value_result
-        # elif len(new_search.shortlist) and findValue is False:
-        #
-        # # If you have more k amount of nodes in your shortlist then stop
-        # # or ...
-        # if (len(new_search.shortlist) >= constants.k) or (
-        # new_search.shortlist[0] == new_search.previous_closest_node and len(
-        # new_search.active_probes) ==
-        # new_search.slowNodeCount[0]):
-        # if new_search.callback is not None:
-        # new_search.callback(new_search.shortlist)
-        # return
-
-        # Update closest node
-        if len(self.activePeers):
-            closestPeer = self.activePeers[0]
-            closestPeer_ip = urlparse(closestPeer.address).hostname
-            closestPeer_port = urlparse(closestPeer.address).port
-            new_search.previous_closest_node = (closestPeer_ip, closestPeer_port, closestPeer.guid)
-
-        # Sort short list again
-        if len(new_search.shortlist) > 1:
-
-            # Remove dupes
-            new_search.shortlist = self.dedupe(new_search.shortlist)
-            self.log.info(new_search.shortlist)
-
-            new_search.shortlist.sort(lambda firstNode, secondNode, targetKey=new_search.key: cmp(
-                self.routingTable.distance(firstNode[2], targetKey),
-                self.routingTable.distance(secondNode[2], targetKey)))
-
-            new_search.prevShortlistLength = len(new_search.shortlist)
+        self._searchIteration(new_search)
+
+    def _searchIteration(self, new_search):
+        """ Send the next probes of a lookup.
+
+        No more than constants.alpha probes of a search are in flight at a
+        time, and the closest nodes of the shortlist that were not contacted
+        yet are probed first. A probe ends when its node responds or after
+        constants.findNodeTimeout, which frees its slot for the next node. The
+        search has converged, and calls back with its shortlist, once the
+        k closest nodes of the shortlist have all been probed.
 
+        @param new_search: The search to advance.
+        @type new_search: DHTSearch
+        """
         # See if search was cancelled
         if not self.activeSearchExists(new_search.findID):
             self.log.info('Active search does not exist')
             return
 
-        # Send findNodes out to all nodes in the shortlist
-        for node in new_search.shortlist:
-            if node not in new_search.already_contacted:
-                if node[2] is not None and node[2] != self.transport.guid:
+        findValue = new_search.call != 'findNode'
+        probes = []
 
-                    new_search.active_probes.append(node)
-                    new_search.already_contacted.append(node)
+        with new_search.lock:
+            if new_search.finished:
+                return
 
-                    contact = self.routingTable.getContact(node[2])
+            shortlist = new_search.closest(constants.k)
 
-                    if contact:
+            # Update closest node
+            if shortlist:
+                new_search.previous_closest_node = shortlist[0]
 
-                        msg = {"type": "findNode",
-                               "uri": contact.transport.uri,
-                               "senderGUID": self.transport.guid,
-                               "key": new_search.key,
-                               "findValue": findValue,
-                               "senderNick": self.transport.nickname,
-                               "findID": new_search.findID,
-                               "pubkey": contact.transport.pubkey}
-                        self.log.debug('Sending findNode to: %s %s' % (contact.address, msg))
+            for node in shortlist:
+                if len(new_search.active_probes) >= constants.alpha:
+                    break
+                guid = node[2]
+                if guid is None or guid == self.transport.guid \
+                        or guid in new_search.already_contacted:
+                    continue
 
-                        Thread(target=contact.send, args=(msg,)).start()
-                        new_search.contactedNow += 1
+                new_search.already_contacted.add(guid)
 
-                    else:
-                        self.log.error('No contact was found for this guid: %s' % node[2])
+                contact = self.routingTable.getContact(guid)
+                if not contact:
+                    self.log.error('No contact was found for this guid: %s' % guid)
+                    continue
 
-            # if new_search.contactedNow == constants.alpha:
-            #     break
+                new_search.active_probes[guid] = node
+                probes.append(contact)
 
-    def activeSearchExists(self, findID):
+            new_search.slowNodeCount[0] = len(new_search.active_probes)
+            converged = not new_search.active_probes
+
+        if converged:
+            self.log.info('Search Finished')
+            self._finishSearch(new_search)
+            return
+
+        # Send findNodes out to the nodes picked for this round
+        for contact in probes:
+            msg = {"type": "findNode",
+                   "uri": contact.transport.uri,
+                   "senderGUID": self.transport.guid,
+                   "key": new_search.key,
+                   "findValue": findValue,
+                   "senderNick": self.transport.nickname,
+                   "findID": new_search.findID,
+                   "pubkey": contact.transport.pubkey}
+            self.log.debug('Sending findNode to: %s %s' % (contact.address, msg))
+
+            self.transport.worker_pool.submit(contact.send, msg)
+            new_search.contactedNow += 1
+
+            # Timeouts may only be added from the IOLoop thread
+            self._io_loop.add_callback(
+                self._io_loop.add_timeout,
+                time.time() + constants.findNodeTimeout,
+                partial(self._probeTimedOut, new_search, contact.guid)
+            )
 
-        activeSearchExists = False
-        for search in self.searches:
-            if findID == search.findID:
-                return True
-        if not activeSearchExists:
-            return False
+    @staticmethod
+    def _endProbe(search, guid):
+        """ Mark the probe to a node as answered or timed out.
+
+        @return: False if there was no probe in flight to this node.
+        @rtype: bool
+        """
+        with search.lock:
+            return search.active_probes.pop(guid, None) is not None
+
+    def _probeTimedOut(self, search, guid):
+        if self._endProbe(search, guid):
+            self.log.debug('No findNode response from %s after %ss' %
+                           (guid, constants.findNodeTimeout))
+            # Don't hold up the IOLoop with the next round
+            self.transport.worker_pool.submit(self._searchIteration, search)
+
+    def _finishSearch(self, search, result=None, expired=False):
+        """ End a search and call its callback, only once.
+
+        @param result: What to call back with; by default the k closest
+                       nodes of the shortlist.
+        @param expired: The search is ended because it ran for longer than
+                        constants.searchTTL.
+        """
+        with search.lock:
+            if search.finished:
+                return
+            search.finished = True
+            search.active_probes.clear()
+            if result is None:
+                result = search.closest(constants.k)
+
+        with self._searchesLock:
+            self.searches.pop(search.findID, None)
+            if expired:
+                self._searchesExpired += 1
+            else:
+                self._searchesCompleted += 1
+
+        if search.callback is not None:
+            search.callback(result)
+
+    def _reapSearches(self):
+        """ Periodically called on the IOLoop to end the searches that have
+        been running for longer than constants.searchTTL """
+        deadline = time.time() - constants.searchTTL
+        expired = [search for search in self.searches.values()
+                   if search.created < deadline]
+
+        for search in expired:
+            self.log.info('Search %s expired' % search.findID)
+            self.transport.worker_pool.submit(
+                self._finishSearch, search, expired=True
+            )
+
+    def getSearchStats(self):
+        """ Metrics of the searches of this node.
+
+        @return: The number of searches in progress, along with the number
+                 of searches started, completed and expired.
+        @rtype: dict
+        """
+        with self._searchesLock:
+            return {
+                'active': len(self.searches),
+                'started': self._searchesStarted,
+                'completed': self._searchesCompleted,
+                'expired': self._searchesExpired
+            }
+
+    def activeSearchExists(self, findID):
+        return findID in self.searches
 
     def iterativeFindValue(self, key, callback=None):
         self._iterativeFind(key, call='findValue', callback=callback)
@@ -874,9 +930,8 @@ class DHTSearch(object):
         self.key = key  # Key to search for
         self.call = call  # Either findNode or findValue depending on search
         self.callback = callback  # Callback for when search finishes
-        self.shortlist = []  # List of nodes that are being searched against
-        self.active_probes = []  #
-        self.already_contacted = []  # Nodes are added to this list when they've been sent a findXXX action
+        self.active_probes = {}  # Nodes with a findXXX in flight, by GUID
+        self.already_contacted = set()  # GUIDs of the nodes sent a findXXX action
         self.previous_closest_node = None  # This is updated to be the closest node found during search
         self.find_value_result = {}  # If a findValue search is found this is the value
         self.pendingIterationCalls = []  #
@@ -884,6 +939,15 @@ class DHTSearch(object):
         self.contactedNow = 0  # Counter for how many nodes have been contacted
         self.dhtCallbacks = []  # Callback list
         self.prevShortlistLength = 0
+        self.finished = False  # Set once the callback has been called
+        self.created = time.time()
+        self.lock = threading.RLock()  # Responses and timeouts race
+
+        # Shortlist as (distance, node) pairs from the closest to the
+        # farthest node, and the IDs of its nodes for membership tests
+        self.targetKey = routingtable.RoutingTable.keyToLong(key)
+        self._shortlist = []
+        self._shortlistIDs = set()
 
         self.log = logging.getLogger(
             '[%s] %s' % (market_id, self.__class__.__name__)
@@ -892,11 +956,49 @@ class DHTSearch(object):
         # Create a unique ID (SHA1) for this _iterativeFind request to support parallel searches
         self.findID = hashlib.sha1(os.urandom(128)).hexdigest()
 
+    @property
+    def shortlist(self):
+        """ Nodes that are being searched against, from the closest to the
+        farthest. """
+        with self.lock:
+            return [node for _, node in self._shortlist]
+
+    @shortlist.setter
+    def shortlist(self, nodes):
+        with self.lock:
+            self._shortlist = []
+            self._shortlistIDs = set()
+            self.add_to_shortlist(nodes)
+
+    def closest(self, count):
+        """ The `count` closest nodes of the shortlist. """
+        with self.lock:
+            return [node for _, node in self._shortlist[:count]]
+
+    def distance(self, node):
+        """ XOR distance of a node to the key of this search; nodes without
+        a valid GUID are sorted last. """
+        try:
+            return routingtable.RoutingTable.keyToLong(node[2]) ^ self.targetKey
+        except (TypeError, ValueError):
+            return float('inf')
+
+    @staticmethod
+    def _nodeID(node):
+        # Nodes are known by GUID, whatever the shape of their tuple, unless
+        # they don't have one
+        if node[2] is None:
+            return tuple(node)
+        return node[2]
+
     def add_to_shortlist(self, additions):
 
         self.log.debug('Additions: %s' % additions)
-        for item in additions:
-            if item not in self.shortlist:
-                self.shortlist.append(item)
+        with self.lock:
+            for item in additions:
+                nodeID = self._nodeID(item)
+                if nodeID not in self._shortlistIDs:
+                    self._shortlistIDs.add(nodeID)
+                    bisect.insort(self._shortlist, (self.distance(item), item))
 
         self.log.debug('Updated short list: %s' % self.shortlist)
@@ -0,0 +1,148 @@
+"""
+Envelopes carrying encrypted messages between peers.
+
+An envelope is a set of named fields, encoded either as a JSON object with
+the binary fields hex encoded (understood by every peer) or, for peers that
+advertise the 'binary' capability, in a compact binary layout:
+
+    version (1 byte) | kind (1 byte) | field | field | ...
+
+where integer fields are 8 byte unsigned big endian numbers and the other
+fields are prefixed by their length as a 4 byte unsigned big endian number.
+The version byte can't be mistaken for the first byte of a JSON object or of
+a zlib stream, see node.compression.
+"""
+import json
+import struct
+
+CAPABILITY = 'binary'
+VERSION = 1
+
+# Envelope kinds
+ECIES = 1
+SESSION = 2
+
+# Field types
+BYTES = 'bytes'  # raw bytes, hex encoded in JSON envelopes
+HEX = 'hex'      # hex string, sent as raw bytes in binary envelopes
+INT = 'int'
+
+FIELDS = {
+    ECIES: (
+        ('sig', BYTES),
+        ('data', BYTES),
+    ),
+    SESSION: (
+        ('session', BYTES),
+        ('created', INT),
+        ('skey', BYTES),
+        ('ssig', BYTES),
+        ('spub', HEX),
+        ('ctr', INT),
+        ('iv', BYTES),
+        ('data', BYTES),
+        ('mac', BYTES),
+    ),
+}
+
+_LENGTH = struct.Struct('>I')
+_INT = struct.Struct('>Q')
+
+
+class EnvelopeError(ValueError):
+    pass
+
+
+def is_binary(serialized):
+    return serialized[:1] == chr(VERSION)
+
+
+def encode(kind, fields, binary=False):
+    """
+    @param kind: ECIES or SESSION.
+    @param fields: The value of every field of the kind.
+    @type fields: dict
+    @param binary: Use the binary layout instead of JSON.
+    @rtype: str
+    """
+    if binary:
+        return _encode_binary(kind, fields)
+
+    msg = {}
+    for name, field_type in FIELDS[kind]:
+        value = fields[name]
+        msg[name] = value.encode('hex') if field_type == BYTES else value
+    return json.dumps(msg)
+
+
+def _encode_binary(kind, fields):
+    parts = [chr(VERSION), chr(kind)]
+    for name, field_type in FIELDS[kind]:
+        value = fields[name]
+        if field_type == INT:
+            parts.append(_INT.pack(value))
+            continue
+        if field_type == HEX:
+            value = value.decode('hex')
+        parts.append(_LENGTH.pack(len(value)))
+        parts.append(value)
+    return ''.join(parts)
+
+
+def decode(serialized):
+    """
+    Parse a message received from a peer.
+
+    @return: The kind of envelope and its fields, or None and the message
+             itself for messages sent in the clear (e.g. 'hello').
+    @rtype: tuple
+    @raise ValueError: The message is neither JSON nor a binary envelope.
+    """
+    if is_binary(serialized):
+        return _decode_binary(serialized)
+
+    msg = json.loads(serialized)
+    if not isinstance(msg, dict) or msg.get('type') is not None:
+        return None, msg
+
+    kind = SESSION if 'session' in msg else ECIES
+    fields = {}
+    try:
+        for name, field_type in FIELDS[kind]:
+            value = msg[name]
+            fields[name] = value.decode('hex') if field_type == BYTES \
+                else value
+    except (KeyError, AttributeError, TypeError) as e:
+        raise EnvelopeError('Malformed envelope: %s' % e)
+    return kind, fields
+
+
+def _decode_binary(serialized):
+    if len(serialized) < 2 or ord(serialized[1]) not in FIELDS:
+        raise EnvelopeError('Unknown envelope kind')
+
+    kind = ord(serialized[1])
+    offset = 2
+    fields = {}
+    try:
+        for name, field_type in FIELDS[kind]:
+            if field_type == INT:
+                fields[name], = _INT.unpack_from(serialized, offset)
+                offset += _INT.size
+                continue
+
+            length, = _LENGTH.unpack_from(serialized, offset)
+            offset += _LENGTH.size
+            value = serialized[offset:offset + length]
+            if len(value) != length:
+                raise EnvelopeError('Truncated envelope')
+            offset += length
+
+            fields[name] = value.encode('hex') if field_type == HEX \
+                else value
+    except struct.error as e:
+        raise EnvelopeError('Truncated envelope: %s' % e)
+
+    if offset != len(serialized):
+        raise EnvelopeError('Trailing data after envelope')
+    return kind, fields
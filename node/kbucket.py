@@ -1,4 +1,7 @@
+from collections import OrderedDict
+from itertools import islice
 import logging
+import threading
 
 from six import string_types
 import constants
@@ -26,7 +29,12 @@ class KBucket(object):
         self.lastAccessed = 0
         self.rangeMin = rangeMin
         self.rangeMax = rangeMax
-        self.contacts = []
+        # Contacts by GUID, from the least to the most recently seen, and
+        # the GUID each contact object was added under, as contacts may be
+        # updated in place
+        self._contacts = OrderedDict()
+        self._keys = {}
+        self._lock = threading.Lock()
         self.market_id = market_id
 
         self.log = logging.getLogger(
@@ -34,14 +42,32 @@ class KBucket(object):
         )
 
     def __len__(self):
-        return len(self.contacts)
+        return len(self._contacts)
+
+    @property
+    def contacts(self):
+        """
+        The contacts of the bucket, from the least to the most recently seen.
+
+        @rtype: list of connection.CryptoPeerConnection
+        """
+        with self._lock:
+            return self._contacts.values()
+
+    @staticmethod
+    def _contactID(contact):
+        """ The GUID of a contact, or the GUID itself if one is given """
+        if isinstance(contact, string_types):
+            return contact
+        return getattr(contact, 'guid', contact)
 
     def addContact(self, contact):
         """
         Add a contact to the contact list.
 
         The new contact is always appended to the contact list after removing
-        any prior occurences of the same contact.
+        any prior occurences of the same contact. A contact whose GUID
+        changed since it was added is moved to its new GUID.
 
         @param contact: The contact to add or a string containing the
                         contact's node ID
@@ -50,42 +76,46 @@ class KBucket(object):
         @raise node.kbucket.BucketFull: The bucket is full and the contact
                                         to add is not already in it.
         """
-        try:
-            # Assume contact exists. Attempt to remove the old one...
-            self.contacts.remove(contact)
-            # ... and add the new one at the end of the list.
-            self.contacts.append(contact)
-
-            # The code above works as follows:
-            # Assume C1 is the existing contact and C2 is the new contact.
-            # Iff C1 is equal to C2, it will be removed from the list.
-            # Since Contact.__eq__ compares only GUIDs, contact C1 will
-            # be replaced even if it's not exactly the same as C2.
-            # This is the intended behaviour; the fresh contact may have
-            # updated add-on data (e.g. optimization-specific stuff).
-        except ValueError:
-            # The contact wasn't there after all, so add it.
-            if len(self.contacts) < constants.k:
-                self.contacts.append(contact)
-            else:
+        contactID = self._contactID(contact)
+        with self._lock:
+            oldID = self._keys.get(id(contact))
+            if oldID is not None and oldID != contactID:
+                self._remove(oldID)
+
+            if contactID in self._contacts:
+                # Remove the old contact and add the new one at the end.
+                # Contacts are keyed by GUID, so an existing contact is
+                # replaced even if it's not exactly the same object. This is
+                # the intended behaviour; the fresh contact may have updated
+                # add-on data (e.g. optimization-specific stuff).
+                self._remove(contactID)
+            elif len(self._contacts) >= constants.k:
                 raise BucketFull('No space in bucket to insert contact')
+            self._contacts[contactID] = contact
+            if not isinstance(contact, string_types):
+                self._keys[id(contact)] = contactID
+
+    def _remove(self, contactID):
+        contact = self._contacts.pop(contactID)
+        self._keys.pop(id(contact), None)
 
     def getContact(self, contactID):
         """
         Return the contact with the specified ID or None if not present.
 
+        Contacts whose GUID changed since they were added are only found
+        under their new GUID once they are added again.
+
         @param contactID: The ID to search.
         @type contact: connection.CryptoPeerConnection or str
 
         @rtype: connection.CryptoPeerConnection or None
         """
-        self.log.debug('[getContact] %s' % contactID)
-        for contact in self.contacts:
-            if contact == contactID:
-                self.log.debug('[getContact] Found %s' % contact)
-                return contact
-        self.log.debug('[getContact] No Results')
-        return None
+        contactID = self._contactID(contactID)
+        contact = self._contacts.get(contactID)
+        if contact is not None and self._contactID(contact) != contactID:
+            return None
+        return contact
 
     def getContacts(self, count=-1, excludeContact=None):
         """
@@ -120,32 +150,41 @@ class KBucket(object):
         # Return no more contacts than bucket size.
         count = min(count, constants.k)
 
-        contactList = self.contacts[:count]
+        with self._lock:
+            contactIDs = list(islice(self._contacts, count))
+            contactList = [self._contacts[contactID]
+                           for contactID in contactIDs]
+
         if excludeContact is not None:
-            try:
-                # NOTE: If the excludeContact is removed, the resulting
-                # list has one less contact than expected. Not sure if
-                # this is a bug.
-                contactList.remove(excludeContact)
-            except ValueError:
-                self.log.debug(
-                    '[kbucket.getContacts() warning] '
-                    'tried to exclude non-existing contact '
-                    '(%s)' % excludeContact
-                )
+            # NOTE: If the excludeContact is removed, the resulting
+            # list has one less contact than expected. Not sure if
+            # this is a bug.
+            excludeID = self._contactID(excludeContact)
+            if excludeID in contactIDs:
+                del contactList[contactIDs.index(excludeID)]
         return contactList
 
     def removeContact(self, contact):
         """
         Remove given contact from contact list.
 
+        A contact object is removed even if its GUID changed since it was
+        added.
+
         @param contact: The contact to remove, or a string containing the
                         contact's node ID
         @type contact: connection.CryptoPeerConnection or str
 
         @raise ValueError: The specified contact is not in this bucket
         """
-        self.contacts.remove(contact)
+        with self._lock:
+            contactID = self._keys.get(id(contact))
+            if contactID is None:
+                contactID = self._contactID(contact)
+            try:
+                self._remove(contactID)
+            except KeyError:
+                raise ValueError('Contact %s is not in this bucket' % contact)
 
     def keyInRange(self, key):
         """
@@ -0,0 +1,100 @@
+from collections import namedtuple, OrderedDict
+from urlparse import urlparse
+import threading
+import time
+
+import constants
+
+KnownNode = namedtuple('KnownNode', ['ip', 'port', 'guid', 'nickname'])
+
+
+class KnownNodes(object):
+    """
+    Nodes this node has heard of, by GUID, from the least to the most
+    recently seen.
+
+    Nodes are stored as KnownNode tuples, which can be used as DHT search
+    shortlist entries. Once `max_size` nodes are known, the least recently
+    seen one is forgotten for every new one, and nodes not seen for
+    `max_age` seconds are forgotten as well.
+    """
+
+    def __init__(self, max_size=None, max_age=None):
+        self.max_size = max_size or constants.knownNodesSize
+        self.max_age = max_age or constants.knownNodeTTL
+
+        # GUID -> (KnownNode, public key, last seen)
+        self._nodes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __iter__(self):
+        with self._lock:
+            return iter([entry[0] for entry in self._nodes.values()])
+
+    def __contains__(self, node):
+        entry = self._nodes.get(node[2])
+        return entry is not None and entry[0] == tuple(node)
+
+    def add(self, uri, guid, nickname=None, pubkey=None, now=None):
+        """
+        Record that a node was seen.
+
+        Values that are not given are kept from earlier sightings.
+
+        @param uri: The address of the node, e.g. tcp://10.0.0.1:12345
+        @type uri: str
+        @param guid: The GUID of the node; nodes without one are ignored.
+        @type guid: str
+        """
+        if guid is None:
+            return
+
+        if now is None:
+            now = time.time()
+        parsed = urlparse(uri)
+
+        with self._lock:
+            old = self._nodes.pop(guid, None)
+            if old is not None:
+                old_node, old_pubkey, _ = old
+                if nickname is None:
+                    nickname = old_node.nickname
+                if pubkey is None:
+                    pubkey = old_pubkey
+
+            node = KnownNode(parsed.hostname, parsed.port, guid, nickname)
+            self._nodes[guid] = (node, pubkey, now)
+
+            self._expire(now)
+            while len(self._nodes) > self.max_size:
+                self._nodes.popitem(last=False)
+
+    def _expire(self, now):
+        # The least recently seen nodes come first
+        deadline = now - self.max_age
+        while self._nodes:
+            guid, (_, _, last_seen) = next(self._nodes.iteritems())
+            if last_seen >= deadline:
+                break
+            del self._nodes[guid]
+
+    def get(self, guid):
+        """
+        @return: The node with this GUID, its public key and when it was last
+                 seen, or None.
+        @rtype: tuple
+        """
+        return self._nodes.get(guid)
+
+    def is_known(self, uri, pubkey, guid, nickname):
+        """ Whether the node is known with exactly these details. """
+        entry = self._nodes.get(guid)
+        if entry is None:
+            return False
+        node, known_pubkey, _ = entry
+        parsed = urlparse(uri)
+        return (node.ip, node.port, node.nickname, known_pubkey) == \
+            (parsed.hostname, parsed.port, nickname, pubkey)
@@ -17,8 +17,7 @@ from pybitcointools.main import privkey_to_pubkey
 from data_uri import DataURI
 from orders import Orders
 from protocol import proto_page, query_page
-from threading import Thread
-from crypto_util import makePrivCryptor
+from crypto_util import getPrivCryptor
 
 import random
 import json
@@ -238,22 +237,21 @@ class Market(object):
         self.save_contract_to_db(contract_id, msg, signed_data, contract_key)
 
         # Store listing
-        t = Thread(target=self.transport.dht.iterativeStore, args=(
+        self.transport.worker_pool.submit(
+            self.transport.dht.iterativeStore,
             self.transport,
             contract_key,
             str(signed_data),
-            self.transport.guid))
-        t.start()
+            self.transport.guid)
 
-        t2 = Thread(target=self.update_listings_index)
-        t2.start()
+        self.transport.worker_pool.submit(self.update_listings_index)
 
 
         # If keywords are present
         keywords = msg['Contract']['item_keywords']
 
-        t3 = Thread(target=self.update_keywords_on_network, args=(contract_key, keywords,))
-        t3.start()
+        self.transport.worker_pool.submit(
+            self.update_keywords_on_network, contract_key, keywords)
 
 
     def shipping_address(self):
@@ -373,8 +371,8 @@ class Market(object):
             contract = listing.get('Contract')
             keywords = contract.get('item_keywords') if contract is not None else []
 
-            t3 = Thread(target=self.update_keywords_on_network, args=(listings.get('key'), keywords,))
-            t3.start()
+            self.transport.worker_pool.submit(
+                self.update_keywords_on_network, listings.get('key'), keywords)
 
         # Updating the DHT index of your store's listings
         self.update_listings_index()
@@ -391,8 +389,7 @@ class Market(object):
             for n in settings['notaries']:
                 peer = self.dht.routingTable.getContact(n.guid)
                 if peer is not None:
-                    t = Thread(target=peer.start_handshake)
-                    t.start()
+                    self.transport.worker_pool.submit(peer.start_handshake)
                     notaries.append(n)
             return notaries
         # End of untested code
@@ -467,7 +464,7 @@ class Market(object):
         # Sign listing index for validation and tamper resistance
         data_string = str({'guid': self.transport.guid,
                            'contracts': my_contracts})
-        signature = makePrivCryptor(
+        signature = getPrivCryptor(
             self.transport.settings['secret']).sign(data_string).encode('hex')
 
         value = {'signature': signature,
@@ -475,14 +472,12 @@ class Market(object):
                           'contracts': my_contracts}}
 
         # Pass off to thread to keep GUI snappy
-        t = Thread(
-            target=self.transport.dht.iterativeStore,
-            args=(
-                self.transport,
-                contract_index_key,
-                value,
-                self.transport.guid,))
-        t.start()
+        self.transport.worker_pool.submit(
+            self.transport.dht.iterativeStore,
+            self.transport,
+            contract_index_key,
+            value,
+            self.transport.guid)
 
     def remove_contract(self, msg):
         """Remove contract and update own list of contracts keywords"""
@@ -719,8 +714,7 @@ class Market(object):
 
         def send_page_query():
             """Send a request for the local identity page"""
-            t = Thread(target=new_peer.start_handshake)
-            t.start()
+            self.transport.worker_pool.submit(new_peer.start_handshake)
 
             new_peer.send(proto_page(
                 self.transport.uri,
@@ -737,8 +731,7 @@ class Market(object):
                 settings['arbiterDescription'] if 'arbiterDescription' in settings else '',
                 self.transport.sin))
 
-        t = Thread(target=send_page_query)
-        t.start()
+        self.transport.worker_pool.submit(send_page_query)
 
     def on_query_myorders(self, peer):
         """Ran if someone is querying for your page"""
@@ -3,6 +3,7 @@ import tornado.web
 from zmq.eventloop import ioloop
 ioloop.install()
 
+import constants
 from transport import CryptoTransportLayer
 from db_store import Obdb
 from market import Market
@@ -11,7 +12,7 @@ import logging
 import signal
 from threading import Thread
 from twisted.internet import reactor
-from util import open_default_webbrowser
+from util import open_default_webbrowser, StartupTimeline
 from network_util import get_random_free_tcp_port
 import upnp
 import os
@@ -31,34 +32,49 @@ class OpenBazaarStaticHandler(tornado.web.StaticFileHandler):
 class MarketApplication(tornado.web.Application):
     def __init__(self, market_ip, market_port, market_id=1,
                  bm_user=None, bm_pass=None, bm_port=None, seed_peers=None,
-                 seed_mode=0, dev_mode=False, db_path='db/ob.db', disable_sqlite_crypt=False, disable_ip_update=False):
+                 seed_mode=0, dev_mode=False, db_path='db/ob.db', disable_sqlite_crypt=False, disable_ip_update=False,
+                 lazy_init=False):
+        """
+        @param lazy_init: Leave the work that is not needed to serve the web
+                          UI to start_deferred(), to be called once the
+                          application listens.
+        """
         if seed_peers is None:
             seed_peers = []
 
-        db = Obdb(db_path, disable_sqlite_crypt)
-
-        self.transport = CryptoTransportLayer(market_ip,
-                                              market_port,
-                                              market_id,
-                                              db,
-                                              bm_user,
-                                              bm_pass,
-                                              bm_port,
-                                              seed_mode,
-                                              dev_mode,
-                                              disable_ip_update)
+        self.timeline = StartupTimeline(
+            logging.getLogger('[%s] %s' % (market_id, 'Startup'))
+        )
 
-        self.market = Market(self.transport, db)
+        with self.timeline.phase('database'):
+            db = Obdb(db_path, disable_sqlite_crypt)
+            self.db = db
+
+        with self.timeline.phase('transport'):
+            self.transport = CryptoTransportLayer(market_ip,
+                                                  market_port,
+                                                  market_id,
+                                                  db,
+                                                  bm_user,
+                                                  bm_pass,
+                                                  bm_port,
+                                                  seed_mode,
+                                                  dev_mode,
+                                                  disable_ip_update,
+                                                  connect_bitmessage=not lazy_init)
+
+        with self.timeline.phase('market'):
+            self.market = Market(self.transport, db)
 
         # UNUSED
         # def post_joined():
         #     self.transport.dht._refreshNode()
         #     self.market.republish_contracts()
 
-        peers = seed_peers if seed_mode == 0 else []
-        self.transport.join_network(peers)
-
-        Thread(target=reactor.run, args=(False,)).start()
+        self._seed_peers = seed_peers if seed_mode == 0 else []
+        if not lazy_init:
+            self._join_network()
+            self._start_reactor()
 
         handlers = [
             (r"/", MainHandler),
@@ -75,6 +91,27 @@ class MarketApplication(tornado.web.Application):
     def get_transport(self):
         return self.transport
 
+    def _join_network(self):
+        with self.timeline.phase('join_network'):
+            self.transport.join_network(self._seed_peers)
+
+    def _start_reactor(self):
+        with self.timeline.phase('reactor'):
+            Thread(target=reactor.run, args=(False,)).start()
+
+    def _connect_bitmessage(self):
+        with self.timeline.phase('bitmessage'):
+            self.transport.connect_bitmessage()
+
+    def start_deferred(self):
+        """ Run the startup work left out by lazy_init: join the network,
+        start the Twisted reactor and connect to Bitmessage (on the worker
+        pool, as it blocks on network I/O). Orders are loaded when first
+        needed. """
+        self._join_network()
+        self._start_reactor()
+        self.transport.worker_pool.submit(self._connect_bitmessage)
+
     def setup_upnp_port_mappings(self, http_port, p2p_port):
         upnp.PortMapper.DEBUG = False
         print "Setting up UPnP Port Map Entry..."
@@ -130,6 +167,7 @@ class MarketApplication(tornado.web.Application):
         tornado.ioloop.IOLoop.instance().stop()
 
         self.transport.shutdown()
+        self.db.close()
         os._exit(0)
 
 
@@ -184,7 +222,8 @@ def start_node(my_market_ip,
                                     dev_mode,
                                     database,
                                     disable_sqlite_crypt,
-                                    disable_ip_update)
+                                    disable_ip_update,
+                                    lazy_init=True)
 
     error = True
     p2p_port = my_market_port
@@ -199,6 +238,15 @@ def start_node(my_market_ip,
         except:
             http_port += 1
 
+    time_to_listen = application.timeline.mark('listening')
+    if time_to_listen > constants.startupListenTarget:
+        locallogger.warning(
+            "Listening took %.2fs, more than the %ss target" %
+            (time_to_listen, constants.startupListenTarget)
+        )
+
+    application.start_deferred()
+
     if not disable_upnp:
         application.setup_upnp_port_mappings(http_port, p2p_port)
     else:
@@ -40,9 +40,17 @@ class Orders(object):
         self.log = logging.getLogger('[%s] %s' % (self.market_id, self.__class__.__name__))
         self.gpg = gnupg.GPG()
         self.db = db
-        self.orders = self.get_orders()
+        self._orders = None
         self.transport.add_callback("order", self.on_order)
 
+    @property
+    def orders(self):
+        """ The first page of orders, loaded on first use rather than while
+        the node starts up """
+        if self._orders is None:
+            self._orders = self.get_orders()
+        return self._orders
+
     def on_order(self, msg):
 
         state = msg.get('state')
@@ -875,35 +883,36 @@ class Orders(object):
             self.log.info('I am the seller!')
             state = 'Waiting for Payment'
 
-            merchant_order_id = random.randint(0, 1000000)
-            while len(self.db.selectEntries("orders", {"id": order_id})) > 0:
+            with self.db.transaction():
                 merchant_order_id = random.randint(0, 1000000)
+                while len(self.db.selectEntries("orders", {"id": order_id})) > 0:
+                    merchant_order_id = random.randint(0, 1000000)
 
-            buyer_id = str(bid_data_json['Buyer']['buyer_GUID']) + '-' + str(bid_data_json['Buyer']['buyer_order_id'])
+                buyer_id = str(bid_data_json['Buyer']['buyer_GUID']) + '-' + str(bid_data_json['Buyer']['buyer_order_id'])
 
-            self.db.insertEntry(
-                "orders",
-                {
-                    'market_id': self.transport.market_id,
-                    'contract_key': contract_key,
-                    'order_id': merchant_order_id,
-                    'signed_contract_body': str(contract),
-                    'state': state,
-                    'buyer_order_id': buyer_id,
-                    'merchant': offer_data_json['Seller']['seller_GUID'],
-                    'buyer': bid_data_json['Buyer']['buyer_GUID'],
-                    'notary': notary_data_json['Notary']['notary_GUID'],
-                    'address': multisig_address,
-                    'shipping_address': self.transport._myself.decrypt(
-                        bid_data_json['Buyer']['buyer_deliveryaddr'].decode('hex')),
-                    'item_price': offer_data_json['Contract']['item_price'] if 'item_price' in offer_data_json[
-                        'Contract'] else 0,
-                    'shipping_price': offer_data_json['Contract']['item_delivery'][
-                        'shipping_price'] if 'shipping_price' in offer_data_json['Contract']['item_delivery'] else 0,
-                    'note_for_merchant': bid_data_json['Buyer']['note_for_seller'],
-                    "updated": time.time()
-                }
-            )
+                self.db.insertEntry(
+                    "orders",
+                    {
+                        'market_id': self.transport.market_id,
+                        'contract_key': contract_key,
+                        'order_id': merchant_order_id,
+                        'signed_contract_body': str(contract),
+                        'state': state,
+                        'buyer_order_id': buyer_id,
+                        'merchant': offer_data_json['Seller']['seller_GUID'],
+                        'buyer': bid_data_json['Buyer']['buyer_GUID'],
+                        'notary': notary_data_json['Notary']['notary_GUID'],
+                        'address': multisig_address,
+                        'shipping_address': self.transport._myself.decrypt(
+                            bid_data_json['Buyer']['buyer_deliveryaddr'].decode('hex')),
+                        'item_price': offer_data_json['Contract']['item_price'] if 'item_price' in offer_data_json[
+                            'Contract'] else 0,
+                        'shipping_price': offer_data_json['Contract']['item_delivery'][
+                            'shipping_price'] if 'shipping_price' in offer_data_json['Contract']['item_delivery'] else 0,
+                        'note_for_merchant': bid_data_json['Buyer']['note_for_seller'],
+                        "updated": time.time()
+                    }
+                )
 
             self.transport.handler.send_to_client(None, {"type": "order_notify",
                                                          "msg": "You just received a new order."})
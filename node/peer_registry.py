@@ -0,0 +1,100 @@
+from collections import OrderedDict
+import logging
+import threading
+
+
+class PeerRegistry(object):
+    """
+    The active peers of a node, indexed by GUID and by URI.
+
+    A GUID or a URI belongs to a single peer: adding a peer replaces the
+    peers it shares either with. Peers are also updated in place, so
+    add() must be called again after a peer's GUID or address changes to
+    reindex it; lookups never return a peer whose GUID or address no
+    longer matches.
+    """
+
+    def __init__(self, market_id=1):
+        # Peers by object identity, in the order they were added
+        self._peers = OrderedDict()
+        # The GUID and URI each peer was indexed under
+        self._keys = {}
+        self._by_guid = {}
+        self._by_uri = {}
+        self._lock = threading.Lock()
+
+        self.log = logging.getLogger(
+            '[%s] %s' % (market_id, self.__class__.__name__)
+        )
+
+    def __len__(self):
+        return len(self._peers)
+
+    def __iter__(self):
+        # Iterate over a snapshot, as peers come and go from other threads
+        with self._lock:
+            return iter(self._peers.values())
+
+    def add(self, peer):
+        """
+        Add a peer, or reindex it if it is already known.
+
+        @param peer: The peer to add.
+        @type peer: connection.CryptoPeerConnection
+        @return: True if the peer replaced a known peer with the same GUID
+                 or URI (or was already known itself).
+        @rtype: bool
+        """
+        with self._lock:
+            replaced = id(peer) in self._peers
+            if replaced:
+                self._remove(peer)
+
+            for other in (self._by_guid.get(peer.guid),
+                          self._by_uri.get(peer.address)):
+                if other is not None and id(other) in self._peers:
+                    self.log.debug('Replacing peer %s' % other)
+                    self._remove(other)
+                    replaced = True
+
+            self._peers[id(peer)] = peer
+            self._keys[id(peer)] = (peer.guid, peer.address)
+            if peer.guid:
+                self._by_guid[peer.guid] = peer
+            if peer.address:
+                self._by_uri[peer.address] = peer
+            return replaced
+
+    def remove(self, peer):
+        """ Remove a peer; unknown peers are ignored. """
+        with self._lock:
+            if id(peer) in self._peers:
+                self._remove(peer)
+
+    def _remove(self, peer):
+        del self._peers[id(peer)]
+        guid, uri = self._keys.pop(id(peer))
+        if self._by_guid.get(guid) is peer:
+            del self._by_guid[guid]
+        if self._by_uri.get(uri) is peer:
+            del self._by_uri[uri]
+
+    def get_by_guid(self, guid):
+        """
+        @return: The peer with this GUID or None.
+        @rtype: connection.CryptoPeerConnection
+        """
+        peer = self._by_guid.get(guid)
+        if peer is not None and peer.guid == guid:
+            return peer
+        return None
+
+    def get_by_uri(self, uri):
+        """
+        @return: The peer at this URI or None.
+        @rtype: connection.CryptoPeerConnection
+        """
+        peer = self._by_uri.get(uri)
+        if peer is not None and peer.address == uri:
+            return peer
+        return None
@@ -0,0 +1,144 @@
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+from zmq.eventloop import ioloop
+
+import constants
+
+
+class PeerStore(object):
+    """
+    Write-behind persistence of the peers table.
+
+    Saved peers are queued in memory, only the latest save of each GUID is
+    kept, and the queue is written to the database in a single transaction
+    every `flush_interval` seconds and when the store is shut down.
+    """
+
+    def __init__(self, db, market_id, worker_pool=None, flush_interval=None):
+        """
+        @param db: The database holding the peers table.
+        @type db: db_store.Obdb
+        @param worker_pool: Runs the periodic flushes off the IOLoop; they
+                            run on the IOLoop itself if None.
+        @type worker_pool: worker_pool.WorkerPool
+        """
+        self.db = db
+        self.market_id = market_id
+        self.worker_pool = worker_pool
+        if flush_interval is None:
+            flush_interval = constants.peerFlushInterval
+        self.flush_interval = flush_interval
+
+        # Peer tuples waiting to be written, by GUID (or URI if unknown)
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        # Only one flush writes at a time, so that saves stay in order
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+        self.log = logging.getLogger(
+            '[%s] %s' % (market_id, self.__class__.__name__)
+        )
+
+    def start(self):
+        """ Start flushing periodically on the IOLoop. """
+        if self._timer is None:
+            self._timer = ioloop.PeriodicCallback(
+                self._on_timer, self.flush_interval * 1000,
+                ioloop.IOLoop.instance()
+            )
+            self._timer.start()
+
+    def _on_timer(self):
+        if not self._pending:
+            return
+        if self.worker_pool is not None:
+            self.worker_pool.submit(self.flush)
+        else:
+            self.flush()
+
+    def save(self, peer_tuple):
+        """
+        Queue a peer to be written to the database.
+
+        @param peer_tuple: (uri, pubkey, guid, nickname) of the peer.
+        @type peer_tuple: tuple
+        """
+        uri, _, guid, _ = peer_tuple
+        key = guid if guid is not None else ('uri', uri)
+        with self._lock:
+            # Move the peer to the end, so that it is written after any peer
+            # saved earlier at the same URI
+            self._pending.pop(key, None)
+            self._pending[key] = tuple(peer_tuple)
+
+    def pending(self):
+        return len(self._pending)
+
+    def flush(self):
+        """
+        Write the queued peers in a single transaction.
+
+        Rows with the URI or the GUID of a queued peer are replaced. If the
+        transaction fails, the peers are queued again for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = self._pending
+                self._pending = OrderedDict()
+            if not batch:
+                return
+            peers = batch.values()
+
+            # When several queued peers share a URI, the last one saved wins
+            by_uri = OrderedDict()
+            for peer in peers:
+                by_uri.pop(peer[0], None)
+                by_uri[peer[0]] = peer
+            peers = by_uri.values()
+
+            now = int(time.time())
+            try:
+                with self.db.transaction():
+                    self.db.deleteMany(
+                        "peers", "uri", [peer[0] for peer in peers]
+                    )
+                    self.db.deleteMany(
+                        "peers", "guid",
+                        [peer[2] for peer in peers if peer[2] is not None]
+                    )
+                    for uri, pubkey, guid, nickname in peers:
+                        if guid is not None:
+                            self.db.insertEntry("peers", {
+                                "uri": uri,
+                                "pubkey": pubkey,
+                                "guid": guid,
+                                "nickname": nickname,
+                                "market_id": self.market_id,
+                                "updated": now
+                            })
+            except Exception as e:
+                self.log.error('Could not save %d peers: %s' % (len(peers), e))
+                self._requeue(batch)
+                return
+
+            self.log.debug('Saved %d peers' % len(peers))
+
+    def _requeue(self, batch):
+        """ Queue a batch again, ahead of the peers saved since. """
+        with self._lock:
+            # Peers saved again since the batch was taken are newer
+            for key in self._pending:
+                batch.pop(key, None)
+            batch.update(self._pending)
+            self._pending = batch
+
+    def shutdown(self):
+        """ Stop the periodic flushes and write what is left. """
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+        self.flush()
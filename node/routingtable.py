@@ -1,3 +1,5 @@
+import bisect
+import heapq
 import time
 import random
 import logging
@@ -32,16 +34,42 @@ class RoutingTable(object):
         @type contact: connection.PeerConnection
         """
 
+    @staticmethod
+    def keyToLong(key):
+        """ Returns the integer value of a node ID or key
+
+        @param key: The hex encoded key, or its value
+        @type key: str or long
+
+        @rtype: long
+        """
+        if isinstance(key, (int, long)):
+            return key
+        return long(key, 16)
+
+    @staticmethod
+    def contactKey(contact):
+        """ Returns the integer value of a contact's node ID, using the one
+        precomputed by the contact when there is one
+
+        @rtype: long
+        """
+        key = getattr(contact, 'guid_long', None)
+        if key is None:
+            key = RoutingTable.keyToLong(contact.guid)
+        return key
+
     @staticmethod
     def distance(keyOne, keyTwo):
-        """ Calculate the XOR result between two string variables
+        """ Calculate the XOR distance between two keys
 
-        @return: XOR result of two long variables
+        @param keyOne: A hex encoded key or its value
+        @param keyTwo: A hex encoded key or its value
+
+        @return: XOR result of the values of the two keys
         @rtype: long
         """
-        valKeyOne = long(keyOne.encode('hex'), 16)
-        valKeyTwo = long(keyTwo.encode('hex'), 16)
-        return valKeyOne ^ valKeyTwo
+        return RoutingTable.keyToLong(keyOne) ^ RoutingTable.keyToLong(keyTwo)
 
     def findCloseNodes(self, key, count, _rpcNodeID=None):
         """ Finds a number of known nodes closest to the node/value with the
@@ -140,6 +168,9 @@ class TreeRoutingTable(RoutingTable):
         self.buckets = [
             kbucket.KBucket(rangeMin=0, rangeMax=2 ** 200, market_id=market_id)
         ]
+        # Lower boundary of every bucket, in the same (sorted) order as
+        # self.buckets, for bisecting the bucket of a key
+        self.bucketBounds = [self.buckets[0].rangeMin]
         self.parentNodeID = parentNodeID
 
     def addContact(self, contact):
@@ -154,7 +185,7 @@ class TreeRoutingTable(RoutingTable):
         if contact.guid == self.parentNodeID:
             return
 
-        bucketIndex = self.kbucketIndex(contact.guid)
+        bucketIndex = self.kbucketIndex(self.contactKey(contact))
 
         # If already added then update
         if not self.buckets[bucketIndex].getContact(contact):
@@ -233,39 +264,29 @@ class TreeRoutingTable(RoutingTable):
                  This method will return C{k} (or C{count}, if specified)
                  contacts if at all possible; it will only return fewer if the
                  node is returning all of the contacts that it knows of.
+                 The contacts are sorted from the closest to the farthest.
         @rtype: list
         """
-        bucketIndex = self.kbucketIndex(key)
-        bucket = self.buckets[bucketIndex]
-        closestNodes = bucket.getContacts(constants.k, nodeID)
-
-        # This method must return k contacts (even if we have the node with
-        # the specified key as node ID), unless there is less than k remote
-        # nodes in the routing table
-        i = 1
-        canGoLower = bucketIndex - i >= 0
-        canGoHigher = bucketIndex + i < len(self.buckets)
-        # Fill up the node list to k nodes, starting with the closest
-        # neighbouring nodes known
-        while len(closestNodes) < constants.k and (canGoLower or canGoHigher):
-            # TODO: this may need to be optimized
-            if canGoLower:
-                bucket = self.buckets[bucketIndex - i]
-                closestNodes.extend(
-                    bucket.getContacts(
-                        constants.k - len(closestNodes), nodeID
-                    )
-                )
-                canGoLower = bucketIndex - (i + 1) >= 0
-            if canGoHigher:
-                bucket = self.buckets[bucketIndex + i]
-                closestNodes.extend(
-                    bucket.getContacts(
-                        constants.k - len(closestNodes), nodeID
+        targetKey = self.keyToLong(key)
+        contactKey = self.contactKey
+        excludeID = None
+        if nodeID is not None:
+            excludeID = getattr(nodeID, 'guid', nodeID)
+
+        candidates = []
+        for bucket in self.buckets:
+            for contact in bucket.getContacts():
+                if contact.guid != excludeID:
+                    candidates.append(
+                        (contactKey(contact) ^ targetKey, contact)
                     )
-                )
-                canGoHigher = bucketIndex + (i + 1) < len(self.buckets)
-            i += 1
+
+        # Partial sort: only the `count` closest contacts get ordered
+        closestNodes = [
+            contact for _, contact in heapq.nsmallest(
+                count, candidates, key=lambda c: c[0]
+            )
+        ]
 
         self.log.debug('Closest Nodes: %s' % closestNodes)
         return closestNodes
@@ -346,21 +367,16 @@ class TreeRoutingTable(RoutingTable):
         specified key (or ID)
 
         @param key: The key for which to find the appropriate k-bucket index
-        @type key: str
+        @type key: str or long
 
         @return: The index of the k-bucket responsible for the specified key
         @rtype: int
         """
-        # print key
-        # print obelisk.DecodeBase58Check(key)
-        valKey = long(key, 16)
+        valKey = self.keyToLong(key)
 
-        i = 0
-        for bucket in self.buckets:
-            if bucket.keyInRange(valKey):
-                return i
-            else:
-                i += 1
+        i = bisect.bisect_right(self.bucketBounds, valKey) - 1
+        if i < 0 or not self.buckets[i].keyInRange(valKey):
+            return len(self.buckets)
         return i
 
     def _randomIDInBucketRange(self, bucketIndex):
@@ -401,9 +417,10 @@ class TreeRoutingTable(RoutingTable):
         oldBucket.rangeMax = splitPoint
         # Now, add the new bucket into the routing table tree
         self.buckets.insert(oldBucketIndex + 1, newBucket)
+        self.bucketBounds.insert(oldBucketIndex + 1, splitPoint)
         # Finally, copy all nodes that belong to the new k-bucket into it...
         for contact in oldBucket.contacts:
-            if newBucket.keyInRange(contact.guid):
+            if newBucket.keyInRange(self.contactKey(contact)):
                 newBucket.addContact(contact)
         # ...and remove them from the old bucket
         for contact in newBucket.contacts:
@@ -440,7 +457,7 @@ class OptimizedTreeRoutingTable(TreeRoutingTable):
         # Initialize/reset the "successively failed RPC" counter
         contact.failedRPCs = 0
 
-        bucketIndex = self.kbucketIndex(contact.guid)
+        bucketIndex = self.kbucketIndex(self.contactKey(contact))
 
         old_contact = self.buckets[bucketIndex].getContact(contact)
 
@@ -0,0 +1,309 @@
+"""
+Symmetric session encryption between peers.
+
+Peers advertise support with the 'session' capability in their 'ok' reply.
+To talk to such a peer, a sender picks random key material, wraps it once
+for the peer with ECIES and signs the session id, creation time and wrapped
+key with its own key. Every message of the session carries that header, so
+the receiver can open the session from whichever message it sees first (or
+again after a restart) and only pays for the ECIES decryption and signature
+check once per session.
+
+Payloads are encrypted with AES-256-CFB under a fresh IV and authenticated
+with HMAC-SHA256 over the session id, message counter, IV and ciphertext
+(encrypt-then-MAC). Receivers reject counters outside a sliding replay
+window, and every message of the sessions they dropped from their cache.
+"""
+import hashlib
+import hmac
+import os
+import struct
+import threading
+import time
+
+import pyelliptic as ec
+
+import constants
+from crypto_util import getPubCryptor
+from util import LRUCache
+
+CAPABILITY = 'session'
+CIPHER = 'aes-256-cfb'
+
+# Tolerated difference between the clocks of two peers
+# [seconds]
+CLOCK_SKEW = 300
+
+# Message counters are sent as unsigned 64 bit integers
+MAX_COUNTER = 2 ** 64 - 1
+
+
+class SessionError(Exception):
+    pass
+
+
+def _derive_keys(key_material):
+    """ Split the session key material into an encryption and a MAC key """
+    digest = hashlib.sha512(key_material).digest()
+    return digest[:32], digest[32:]
+
+
+def _mac(mac_key, session_id, counter, iv, ciphertext):
+    return hmac.new(
+        mac_key,
+        session_id + struct.pack('>Q', counter) + iv + ciphertext,
+        hashlib.sha256
+    ).digest()
+
+
+def _header(session_id, created, wrapped_key):
+    """ The part of a session signed by its sender """
+    return session_id + struct.pack('>Q', created) + wrapped_key
+
+
+class ReplayWindow(object):
+    """
+    Remembers which of the last `size` message counters have been seen, so
+    that messages reordered by the network are accepted once and only once.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.highest = 0
+        self.bitmap = 0
+
+    def accept(self, counter):
+        """
+        @return: False if the counter was already seen or is too old.
+        @rtype: bool
+        """
+        if counter <= 0:
+            return False
+
+        if counter > self.highest:
+            shift = counter - self.highest
+            if shift >= self.size:
+                # Don't build a huge integer only to mask most of it away
+                self.bitmap = 1
+            else:
+                self.bitmap = ((self.bitmap << shift) | 1) & \
+                    ((1 << self.size) - 1)
+            self.highest = counter
+            return True
+
+        offset = self.highest - counter
+        if offset >= self.size or self.bitmap & (1 << offset):
+            return False
+        self.bitmap |= 1 << offset
+        return True
+
+
+class OutboundSession(object):
+    """ Sending half of a session, owned by a CryptoPeerConnection """
+
+    def __init__(self, signer, sender_pubkey, peer_pubkey):
+        """
+        @param signer: Cryptor holding the private key of this node.
+        @param sender_pubkey: Hex public key of this node.
+        @type sender_pubkey: str
+        @param peer_pubkey: Hex public key of the peer.
+        @type peer_pubkey: str
+        """
+        self.peer_pubkey = peer_pubkey
+        self.sender_pubkey = sender_pubkey
+        self.session_id = os.urandom(16)
+        self.created = int(time.time())
+
+        key_material = os.urandom(32)
+        self._enc_key, self._mac_key = _derive_keys(key_material)
+        self.wrapped_key = ec.ECC.encrypt(
+            key_material, getPubCryptor(peer_pubkey).get_pubkey()
+        )
+        self.signature = signer.sign(
+            _header(self.session_id, self.created, self.wrapped_key)
+        )
+
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def expired(self):
+        return (self._counter >= constants.sessionMaxMessages or
+                time.time() - self.created > constants.sessionLifetime)
+
+    def seal(self, plaintext):
+        """
+        Encrypt and authenticate a serialized message.
+
+        @return: The fields of the envelope.SESSION to send to the peer.
+        @rtype: dict
+        """
+        with self._lock:
+            self._counter += 1
+            counter = self._counter
+
+        iv = ec.Cipher.gen_IV(CIPHER)
+        ciphertext = ec.Cipher(
+            self._enc_key, iv, 1, ciphername=CIPHER
+        ).ciphering(plaintext)
+
+        return {
+            'session': self.session_id,
+            'created': self.created,
+            'skey': self.wrapped_key,
+            'ssig': self.signature,
+            'spub': self.sender_pubkey,
+            'ctr': counter,
+            'iv': iv,
+            'data': ciphertext,
+            'mac': _mac(self._mac_key, self.session_id, counter, iv,
+                        ciphertext)
+        }
+
+
+class InboundSession(object):
+    """ Receiving half of a session, kept by the CryptoPeerListener """
+
+    def __init__(self, session_id, created, key_material, sender_pubkey):
+        self.session_id = session_id
+        self.created = created
+        self.sender_pubkey = sender_pubkey
+        self._enc_key, self._mac_key = _derive_keys(key_material)
+        self._window = ReplayWindow(constants.sessionReplayWindow)
+        self._lock = threading.Lock()
+
+    def expired(self):
+        return (time.time() - self.created >
+                constants.sessionLifetime + CLOCK_SKEW)
+
+    def open(self, counter, iv, ciphertext, mac):
+        """
+        Authenticate and decrypt a message of this session.
+
+        @return: The serialized message.
+        @rtype: str
+        """
+        expected = _mac(self._mac_key, self.session_id, counter, iv,
+                        ciphertext)
+        if not hmac.compare_digest(expected, mac):
+            raise SessionError('Bad message authentication code')
+
+        with self._lock:
+            if not self._window.accept(counter):
+                raise SessionError('Replayed message %d' % counter)
+
+        try:
+            return ec.Cipher(
+                self._enc_key, iv, 0, ciphername=CIPHER
+            ).ciphering(ciphertext)
+        except Exception as e:
+            raise SessionError('Could not decrypt message: %s' % e)
+
+
+class InboundSessions(object):
+    """
+    The InboundSessions of the listener, by session id.
+
+    The replay window of a session is lost when the session is evicted, so
+    the ids of evicted sessions are remembered and their messages rejected
+    rather than the session opened again with an empty window.
+    """
+
+    def __init__(self, size, retired_size):
+        """
+        @param size: Number of sessions kept.
+        @type size: int
+        @param retired_size: Number of evicted session ids remembered.
+        @type retired_size: int
+        """
+        self._sessions = LRUCache(size, on_evict=self._retire)
+        self._retired = LRUCache(retired_size)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _retire(self, session_id, session):
+        # Expired sessions can't be opened again anyway
+        if not session.expired():
+            self._retired.put(session_id, session.created)
+
+    def get(self, session_id):
+        """
+        @return: The session, or None if it was not opened yet.
+        @rtype: InboundSession
+        @raise SessionError: The session was evicted.
+        """
+        if session_id in self._retired:
+            raise SessionError('Session was closed')
+        return self._sessions.get(session_id)
+
+    def put(self, session_id, session):
+        self._sessions.put(session_id, session)
+
+
+def open_envelope(msg, cryptor, sessions):
+    """
+    Open a message sealed by an OutboundSession.
+
+    @param msg: The fields of the envelope.SESSION as received.
+    @type msg: dict
+    @param cryptor: Cryptor holding the private key of this node.
+    @param sessions: The InboundSessions opened so far.
+    @type sessions: InboundSessions
+    @return: The serialized message and the public key of its sender.
+    @rtype: tuple
+    """
+    try:
+        session_id = msg['session']
+        counter = int(msg['ctr'])
+        iv = msg['iv']
+        ciphertext = msg['data']
+        mac = msg['mac']
+    except (KeyError, TypeError, ValueError) as e:
+        raise SessionError('Malformed session message: %s' % e)
+
+    if not all(isinstance(field, str)
+               for field in (session_id, iv, ciphertext, mac)):
+        raise SessionError('Malformed session message')
+    if not 1 <= counter <= MAX_COUNTER:
+        raise SessionError('Invalid message counter %d' % counter)
+
+    session = sessions.get(session_id)
+    if session is None or session.expired():
+        session = _open_session(msg, session_id, cryptor)
+        sessions.put(session_id, session)
+
+    return session.open(counter, iv, ciphertext, mac), session.sender_pubkey
+
+
+def _open_session(msg, session_id, cryptor):
+    try:
+        created = int(msg['created'])
+        wrapped_key = msg['skey']
+        signature = msg['ssig']
+        sender_pubkey = msg['spub']
+    except (KeyError, TypeError, ValueError) as e:
+        raise SessionError('Malformed session header: %s' % e)
+
+    if abs(time.time() - created) > constants.sessionLifetime + CLOCK_SKEW:
+        raise SessionError('Session is too old')
+
+    # The header is signed by the sender, but is otherwise whatever the
+    # peer sent: any failure to use it only rejects the message
+    try:
+        sender = getPubCryptor(sender_pubkey)
+    except Exception as e:
+        raise SessionError('Invalid session public key: %s' % e)
+
+    try:
+        header = _header(session_id, created, wrapped_key)
+        verified = sender.verify(signature, header)
+    except Exception as e:
+        raise SessionError('Invalid session signature: %s' % e)
+    if not verified:
+        raise SessionError('Session signature could not be verified')
+
+    try:
+        key_material = cryptor.decrypt(wrapped_key)
+    except Exception as e:
+        raise SessionError('Could not unwrap the session key: %s' % e)
+    return InboundSession(session_id, created, key_material, sender_pubkey)
@@ -6,7 +6,6 @@ from pysqlcipher import dbapi2 as sqlite
 
 import constants
 
-# TODO: Use indexes.
 # TODO: Maybe it makes sense to put tags on a different table
 
 
@@ -167,6 +166,22 @@ def setup_db(db_path, disable_sqlite_crypt=False):
                         "value TEXT, "
                         "FOREIGN KEY(market_id) REFERENCES markets(id))")
 
+            cur.execute("CREATE UNIQUE INDEX datastore_key_market_id "
+                        "ON datastore(key, market_id)")
+
+            # Indexes for the hot lookup columns. datastore.key is covered by
+            # the unique index above since it is its leading column.
+            cur.execute("CREATE INDEX orders_order_id "
+                        "ON orders(order_id)")
+            cur.execute("CREATE INDEX orders_buyer_order_id "
+                        "ON orders(buyer_order_id)")
+            cur.execute("CREATE INDEX orders_market_id_updated "
+                        "ON orders(market_id, updated)")
+            cur.execute("CREATE INDEX peers_guid ON peers(guid)")
+            cur.execute("CREATE INDEX peers_uri ON peers(uri)")
+            cur.execute("CREATE INDEX contracts_market_id_deleted "
+                        "ON contracts(market_id, deleted)")
+
 
 def remove_db(db_path):
     remove(db_path)
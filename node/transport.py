@@ -1,4 +1,8 @@
 import connection
+import compression
+import constants
+import envelope
+import session_crypto
 from dht import DHT
 from protocol import hello_request
 from protocol import hello_response
@@ -13,6 +17,9 @@ from pybitcointools.main import privkey_to_pubkey
 from pybitcointools.main import privtopub
 from pybitcointools.main import random_key
 from crypto_util import pubkey_to_pyelliptic
+from bootstrap import Bootstrap
+from peer_store import PeerStore
+from worker_pool import WorkerPool
 from pysqlcipher.dbapi2 import OperationalError, DatabaseError
 import gnupg
 import xmlrpclib
@@ -20,7 +27,6 @@ import logging
 import pyelliptic as ec
 import json
 import traceback
-from threading import Thread
 import obelisk
 import network_util
 import random
@@ -200,7 +206,9 @@ class TransportLayer(object):
 class CryptoTransportLayer(TransportLayer):
 
     def __init__(self, my_ip, my_port, market_id, db, bm_user=None, bm_pass=None,
-                 bm_port=None, seed_mode=0, dev_mode=False, disable_ip_update=False):
+                 bm_port=None, seed_mode=0, dev_mode=False, disable_ip_update=False,
+                 worker_pool_size=constants.workerPoolSize,
+                 connect_bitmessage=True):
 
         self.log = logging.getLogger(
             '[%s] %s' % (market_id, self.__class__.__name__)
@@ -212,9 +220,7 @@ class CryptoTransportLayer(TransportLayer):
         self.db = db
 
         self.bitmessage_api = None
-        if (bm_user, bm_pass, bm_port) != (None, None, None):
-            if not self._connect_to_bitmessage(bm_user, bm_pass, bm_port):
-                self.log.info('Bitmessage not installed or started')
+        self._bm_credentials = (bm_user, bm_pass, bm_port)
 
         self.market_id = market_id
         self.nick_mapping = {}
@@ -226,6 +232,22 @@ class CryptoTransportLayer(TransportLayer):
         # Set up
         self._setup_settings()
 
+        # Connecting to Bitmessage may be deferred with connect_bitmessage()
+        if connect_bitmessage:
+            self.connect_bitmessage()
+
+        # Threads for blocking work, shared with the DHT and the market
+        self.worker_pool = WorkerPool(
+            worker_pool_size, '[%s] WorkerPool' % market_id
+        )
+        self.probe_pool = WorkerPool(
+            constants.probePoolSize, '[%s] ProbePool' % market_id
+        )
+
+        # Peers are written to the database in batches
+        self.peer_store = PeerStore(self.db, market_id, self.worker_pool)
+        self.peer_store.start()
+
         self.dht = DHT(self, self.market_id, self.settings, self.db)
 
         # self._myself = ec.ECC(pubkey=self.pubkey.decode('hex'),
@@ -249,11 +271,19 @@ class CryptoTransportLayer(TransportLayer):
         self.listener = connection.CryptoPeerListener(
             self.ip, self.port, self.pubkey, self.secret, self._on_message)
 
+        # Uncompressed messages are always understood
+        capabilities = [compression.CAPABILITY]
+        if constants.sessionEncryption:
+            capabilities.append(session_crypto.CAPABILITY)
+        if constants.binaryEnvelope:
+            capabilities.append(envelope.CAPABILITY)
+
         self.listener.set_ok_msg({
                     'type': 'ok',
                     'senderGUID': self.guid,
                     'pubkey': self.pubkey,
-                    'senderNick': self.nickname
+                    'senderNick': self.nickname,
+                    'capabilities': capabilities
                 })
         self.listener.listen()
 
@@ -273,24 +303,28 @@ class CryptoTransportLayer(TransportLayer):
         self.dht._iterativeFind(self.guid, [], 'findNode')
 
     def save_peer_to_db(self, peer_tuple):
-        uri = peer_tuple[0]
-        pubkey = peer_tuple[1]
-        guid = peer_tuple[2]
-        nickname = peer_tuple[3]
-
-        # Update query
-        self.db.deleteEntries("peers", {"uri": uri, "guid": guid}, "OR")
-        # if len(results) > 0:
-        #     self.db.updateEntries("peers", {"id": results[0]['id']}, {"market_id": self.market_id, "uri": uri, "pubkey": pubkey, "guid": guid, "nickname": nickname})
-        # else:
-        if guid is not None:
-            self.db.insertEntry("peers", {
-                "uri": uri,
-                "pubkey": pubkey,
-                "guid": guid,
-                "nickname": nickname,
-                "market_id": self.market_id
-            })
+        """ Queue a (uri, pubkey, guid, nickname) peer tuple to be saved;
+        see PeerStore """
+        self.peer_store.save(peer_tuple)
+
+    def connect_bitmessage(self):
+        """ Connect to the local Bitmessage instance, if one is configured,
+        and create the Bitmessage address of this node if it has none yet
+
+        :return: (bool) True if Bitmessage is available
+        """
+        bm_user, bm_pass, bm_port = self._bm_credentials
+        if (bm_user, bm_pass, bm_port) == (None, None, None):
+            return False
+
+        if not self._connect_to_bitmessage(bm_user, bm_pass, bm_port):
+            self.log.info('Bitmessage not installed or started')
+            return False
+
+        if not self.bitmessage:
+            # Generate Bitmessage address
+            self._generate_new_bitmessage_address()
+        return True
 
     def _connect_to_bitmessage(self, bm_user, bm_pass, bm_port):
         # Get bitmessage going
@@ -421,11 +455,6 @@ class CryptoTransportLayer(TransportLayer):
         self.sin = self.settings['sin'] if 'sin' in self.settings else ""
         self.bitmessage = self.settings['bitmessage'] if 'bitmessage' in self.settings else ""
 
-        if not ('bitmessage' in self.settings and self.settings['bitmessage']):
-            # Generate Bitmessage address
-            if self.bitmessage_api is not None:
-                self._generate_new_bitmessage_address()
-
         self._myself = ec.ECC(
             pubkey=pubkey_to_pyelliptic(self.pubkey).decode('hex'),
             raw_privkey=self.secret.decode('hex'),
@@ -486,12 +515,12 @@ class CryptoTransportLayer(TransportLayer):
         for idx, seed in enumerate(seed_peers):
             seed_peers[idx] = network_util.get_peer_url(seed, "12345")
 
-        # Connect to persisted peers
-        db_peers = self.get_past_peers()
+        # Connect to persisted peers, most recently seen first
+        db_peers = self.get_past_peers(constants.bootstrapPastPeers)
 
-        known_peers = list(set(seed_peers)) + list(set(db_peers))
+        known_peers = seed_peers + db_peers
 
-        self.connect_to_peers(known_peers)
+        self.bootstrap = self.connect_to_peers(known_peers)
 
         # TODO: This needs rethinking. Normally we can search for ourselves
         #       but because we are not connected to them quick enough this
@@ -503,21 +532,30 @@ class CryptoTransportLayer(TransportLayer):
         if callback is not None:
             callback('Joined')
 
-    def get_past_peers(self):
+    def get_past_peers(self, limit=None):
+        """ URIs of the peers saved by save_peer_to_db, from the most to the
+        least recent successful handshake """
         peers = []
-        result = self.db.selectEntries("peers", {"market_id": self.market_id})
+        result = self.db.selectEntries(
+            "peers", {"market_id": self.market_id},
+            order_field=["updated", "id"], order="DESC", limit=limit
+        )
         for peer in result:
             peers.append(peer['uri'])
         return peers
 
     def search_for_my_node(self):
         print 'Searching for myself'
-        self.dht._iterativeFind(self.guid, self.dht.knownNodes, 'findNode')
+        self.dht._iterativeFind(self.guid, self.dht.get_known_nodes(), 'findNode')
 
-    def connect_to_peers(self, known_peers):
-        for known_peer in known_peers:
-            t = Thread(target=self.dht.add_peer, args=(self, known_peer,))
-            t.start()
+    def connect_to_peers(self, known_peers, callback=None):
+        """ Dial the given peer URIs, best first, a few at a time until the
+        routing table is populated
+        :return: (Bootstrap) to follow the progress
+        """
+        bootstrap = Bootstrap(self, known_peers, callback=callback)
+        bootstrap.start()
+        return bootstrap
 
     def get_crypto_peer(self, guid=None, uri=None, pubkey=None, nickname=None,
                         callback=None):
@@ -537,30 +575,27 @@ class CryptoTransportLayer(TransportLayer):
 
     def addCryptoPeer(self, peer_to_add):
 
-        foundOutdatedPeer = False
-        for idx, peer in enumerate(self.dht.activePeers):
+        peer = self.dht.activePeers.get_by_guid(peer_to_add.guid) or \
+            self.dht.activePeers.get_by_uri(peer_to_add.address)
+
+        if peer is not None:
 
             if (peer.address, peer.guid, peer.pub) == \
                (peer_to_add.address, peer_to_add.guid, peer_to_add.pub):
                 self.log.info('Found existing peer, not adding.')
                 return
 
-            if peer.guid == peer_to_add.guid or \
-               peer.pub == peer_to_add.pub or \
-               peer.address == peer_to_add.address:
-
-                foundOutdatedPeer = True
-                self.log.info('Found an outdated peer')
+            self.log.info('Found an outdated peer')
 
-                # Update existing peer
-                self.activePeers[idx] = peer_to_add
-                self.dht.add_peer(self,
-                                  peer_to_add.address,
-                                  peer_to_add.pub,
-                                  peer_to_add.guid,
-                                  peer_to_add.nickname)
+            # Update existing peer
+            self.dht.activePeers.add(peer_to_add)
+            self.dht.add_peer(self,
+                              peer_to_add.address,
+                              peer_to_add.pub,
+                              peer_to_add.guid,
+                              peer_to_add.nickname)
 
-        if not foundOutdatedPeer and peer_to_add.guid != self.guid:
+        elif peer_to_add.guid != self.guid:
             self.log.info('Adding crypto peer at %s' % peer_to_add.nickname)
             self.dht.add_peer(self,
                               peer_to_add.address,
@@ -631,12 +666,8 @@ class CryptoTransportLayer(TransportLayer):
         # Directed message
         if send_to is not None:
 
-            peer = self.dht.routingTable.getContact(send_to)
-            if not peer:
-                for activePeer in self.dht.activePeers:
-                    if activePeer.guid == send_to:
-                        peer = activePeer
-                        break
+            peer = self.dht.routingTable.getContact(send_to) or \
+                self.dht.activePeers.get_by_guid(send_to)
 
             # peer = CryptoPeerConnection(msg['uri'])
             if peer:
@@ -737,16 +768,13 @@ class CryptoTransportLayer(TransportLayer):
 
         pubkey = msg.get('pubkey')
         uri = msg.get('uri')
-        ip = urlparse(uri).hostname
-        port = urlparse(uri).port
         guid = msg.get('senderGUID')
         nickname = msg.get('senderNick')[:120]
 
-        self.dht.add_known_node((ip, port, guid, nickname))
+        self.dht.add_known_node(uri, guid, nickname)
         self.log.info('On Message: %s' % json.dumps(msg, ensure_ascii=False))
         self.dht.add_peer(self, uri, pubkey, guid, nickname)
-        t = Thread(target=self.trigger_callbacks, args=(msg['type'], msg,))
-        t.start()
+        self.worker_pool.submit(self.trigger_callbacks, msg['type'], msg)
 
     def shutdown(self):
         print "CryptoTransportLayer.shutdown()!"
@@ -756,7 +784,11 @@ class CryptoTransportLayer(TransportLayer):
         except Exception as e:
             self.log.error("Transport shutdown error: " + e.message)
 
-        print "Notice: explicit DHT Shutdown not implemented."
+        self.dht.shutdown()
+
+        self.peer_store.shutdown()
+        self.worker_pool.shutdown()
+        self.probe_pool.shutdown()
 
         try:
             self.bitmessage_api.close()
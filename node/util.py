@@ -1,3 +1,8 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import logging
+import threading
+import time
 import webbrowser
 
 
@@ -31,3 +36,130 @@ def open_default_webbrowser(url, protocol="http"):
             url
         )
     return success
+
+
+class LRUCache(object):
+    """
+    A mapping that holds at most `size` entries, evicting the least
+    recently used one when full. Safe to share between threads.
+
+    @param size: Maximum number of entries; 0 or less disables caching.
+    @type size: int
+    @param on_evict: Called with the key and the entry of every entry
+                     evicted to make room for another.
+    @type on_evict: callable
+    """
+
+    def __init__(self, size, on_evict=None):
+        self.size = size
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        """
+        Return the entry for `key` (marking it as most recently used) or
+        `default` if it is not cached.
+        """
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                return default
+            self._entries[key] = value
+            return value
+
+    def put(self, key, value):
+        """
+        Store `value` under `key`, evicting the least recently used entry
+        if the cache is full.
+        """
+        if self.size <= 0:
+            evicted = (key, value)
+        else:
+            evicted = None
+            with self._lock:
+                self._entries.pop(key, None)
+                self._entries[key] = value
+                if len(self._entries) > self.size:
+                    evicted = self._entries.popitem(last=False)
+
+        if evicted is not None and self.on_evict is not None:
+            self.on_evict(*evicted)
+
+    def pop(self, key, default=None):
+        """
+        Remove `key` from the cache and return its entry, or `default`.
+        """
+        with self._lock:
+            return self._entries.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class StartupTimeline(object):
+    """
+    Records how long each phase of the startup of a node takes:
+
+        timeline = StartupTimeline(log)
+        with timeline.phase('transport'):
+            ...
+        timeline.mark('listening')
+
+    Phases may run on other threads than the one that created the timeline.
+
+    @param log: Logger the phases and milestones are reported to.
+    """
+
+    def __init__(self, log=None):
+        self.started_at = time.time()
+        self.log = log or logging.getLogger(self.__class__.__name__)
+        self._phases = []
+        self._marks = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        """ Time the block as the phase `name`. """
+        start = time.time()
+        try:
+            yield
+        finally:
+            duration = time.time() - start
+            with self._lock:
+                self._phases.append((name, start - self.started_at, duration))
+            self.log.info('Startup phase %s took %.3fs' % (name, duration))
+
+    def mark(self, name):
+        """
+        Record that the startup reached the milestone `name`.
+
+        @return: Seconds since the timeline was created.
+        @rtype: float
+        """
+        elapsed = time.time() - self.started_at
+        with self._lock:
+            self._marks[name] = elapsed
+        self.log.info('Startup reached %s after %.3fs' % (name, elapsed))
+        return elapsed
+
+    def summary(self):
+        """
+        @return: The phases as (name, start, duration) tuples in the order
+                 they ended, and the milestones by name, in seconds relative
+                 to the creation of the timeline.
+        @rtype: dict
+        """
+        with self._lock:
+            return {
+                'phases': list(self._phases),
+                'marks': dict(self._marks)
+            }
@@ -0,0 +1,124 @@
+import logging
+import Queue
+import threading
+
+
+class WorkerPool(object):
+    """
+    A fixed number of daemon threads executing blocking work handed to
+    submit(), so callers don't have to spawn a short-lived thread per task.
+
+    Workers are started on the first submission. stats() reports the queue
+    depth along with task counters.
+    """
+
+    def __init__(self, size, name='WorkerPool'):
+        """
+        @param size: Number of worker threads.
+        @type size: int
+        @param name: Used for the thread names and the logger.
+        @type name: str
+        """
+        self.size = size
+        self.name = name
+        self._queue = Queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._stopped = False
+
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._active = 0
+        self._max_queue_depth = 0
+
+        self.log = logging.getLogger(name)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue `func(*args, **kwargs)` for execution on a worker thread.
+        Exceptions raised by `func` are logged and counted, not propagated.
+        """
+        with self._lock:
+            if self._stopped:
+                self.log.error('Pool is shut down, dropping %s' % func)
+                return
+            if not self._workers:
+                self._start_workers()
+            self._submitted += 1
+            self._queue.put((func, args, kwargs))
+            self._max_queue_depth = max(self._max_queue_depth,
+                                        self._queue.qsize())
+
+    def _start_workers(self):
+        for i in range(self.size):
+            worker = threading.Thread(
+                target=self._work,
+                name='%s-%d' % (self.name, i)
+            )
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+
+            func, args, kwargs = task
+            with self._lock:
+                self._active += 1
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                self.log.exception('Task %s failed: %s' % (func, e))
+                with self._lock:
+                    self._failed += 1
+            else:
+                with self._lock:
+                    self._completed += 1
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+    def queue_depth(self):
+        """ Number of tasks waiting for a free worker """
+        return self._queue.qsize()
+
+    def stats(self):
+        """
+        @return: The pool size, current and maximum observed queue depth,
+                 number of busy workers and submitted/completed/failed
+                 task counters.
+        @rtype: dict
+        """
+        with self._lock:
+            return {
+                'size': self.size,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'active': self._active,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed
+            }
+
+    def shutdown(self, wait=False):
+        """
+        Stop accepting work and let the workers exit once the tasks already
+        queued are done.
+
+        @param wait: Block until all the workers have exited.
+        """
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            workers = self._workers
+            for _ in workers:
+                self._queue.put(None)
+
+        if wait:
+            for worker in workers:
+                worker.join()
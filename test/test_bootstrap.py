@@ -0,0 +1,121 @@
+import unittest
+
+import mock
+
+from node.bootstrap import Bootstrap
+
+
+class TestBootstrap(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = mock.Mock()
+        self.transport.market_id = 1
+        self.transport.dht.activePeers.get_by_uri.return_value = None
+        self.transport.dht.routingTable.buckets = [[]]
+
+        # Queue pooled work, to run it when the test wants to
+        self.work = []
+        self.transport.worker_pool.submit.side_effect = \
+            lambda func, *args: self.work.append((func, args))
+
+        # Handshakes are answered by calling the callbacks they were given
+        self.handshakes = {}
+        self.unreachable = set()
+
+        def get_crypto_peer(uri):
+            peer = mock.Mock(address=uri)
+            peer.is_reachable.return_value = uri not in self.unreachable
+            peer.start_handshake.side_effect = \
+                lambda cb: self.handshakes.__setitem__(uri, cb)
+            return peer
+        self.transport.get_crypto_peer.side_effect = get_crypto_peer
+
+        self.callback = mock.Mock()
+        self.io_loop = mock.Mock()
+
+    def _bootstrap(self, uris, **kwargs):
+        bootstrap = Bootstrap(self.transport, uris, concurrency=2, target=3,
+                              first_k=2, callback=self.callback,
+                              io_loop=self.io_loop, **kwargs)
+        bootstrap.start()
+        return bootstrap
+
+    def _run_work(self):
+        work, self.work = self.work, []
+        for func, args in work:
+            func(*args)
+
+    def _answer(self, uri):
+        self.transport.dht.routingTable.buckets[0].append(uri)
+        self.handshakes.pop(uri)()
+
+    def test_concurrency(self):
+        uris = ['tcp://10.0.0.%d:12345' % i for i in range(5)]
+        bootstrap = self._bootstrap(uris + uris[:1])
+        self._run_work()
+        self.assertEqual(sorted(self.handshakes), uris[:2])
+        self.assertEqual(bootstrap.stats()['remaining'], 3)
+
+        # Each handshake done lets the next peer be dialed
+        self._answer(uris[0])
+        self._run_work()
+        self.assertEqual(sorted(self.handshakes), uris[1:3])
+        self.transport.save_peer_to_db.assert_called_once_with(
+            (uris[0], mock.ANY, mock.ANY, mock.ANY)
+        )
+
+    def test_target_reached(self):
+        uris = ['tcp://10.0.0.%d:12345' % i for i in range(5)]
+        bootstrap = self._bootstrap(uris)
+        self._run_work()
+
+        self._answer(uris[0])
+        self._answer(uris[1])
+        self.assertIsNotNone(bootstrap.time_to_first_k)
+        self.assertFalse(self.callback.called)
+        self._run_work()
+
+        self._answer(uris[2])
+        stats = self.callback.call_args[0][0]
+        self.assertTrue(stats['finished'])
+        self.assertEqual(stats['succeeded'], 3)
+        self.assertEqual(stats['routing_table_size'], 3)
+
+        # No more peers are dialed
+        self._run_work()
+        self.assertEqual(sorted(self.handshakes), uris[3:4])
+
+    def test_dial_timeout(self):
+        uris = ['tcp://10.0.0.1:12345']
+        bootstrap = self._bootstrap(uris)
+        self._run_work()
+
+        # The timeout scheduled on the IOLoop fires
+        add_timeout, _, on_timeout = self.io_loop.add_callback.call_args[0]
+        on_timeout()
+        self.assertEqual(bootstrap.stats()['failed'], 1)
+        self.callback.assert_called_once_with(bootstrap.stats())
+
+        # A late answer changes nothing
+        self._answer(uris[0])
+        self.assertEqual(bootstrap.stats()['succeeded'], 0)
+
+    def test_unreachable_peer(self):
+        uris = ['tcp://10.0.0.%d:12345' % i for i in range(3)]
+        self.unreachable.add(uris[0])
+        bootstrap = self._bootstrap(uris)
+        self._run_work()
+
+        # The unreachable peer is not dialed and frees its slot right away
+        self.assertEqual(bootstrap.stats()['failed'], 1)
+        self.assertNotIn(uris[0], self.handshakes)
+        self._run_work()
+        self.assertEqual(sorted(self.handshakes), uris[1:])
+
+    def test_no_peers(self):
+        self._bootstrap([])
+        self.assertTrue(self.callback.call_args[0][0]['finished'])
+
+
+if __name__ == '__main__':
+    unittest.main()
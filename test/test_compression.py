@@ -0,0 +1,44 @@
+import json
+import unittest
+import zlib
+
+from node import compression
+
+
+class TestCompression(unittest.TestCase):
+
+    def setUp(self):
+        self.small = json.dumps({'type': 'hello', 'senderNick': 'nick'})
+        self.large = json.dumps({'type': 'store', 'value': 'abc' * 1000})
+
+    def test_small_messages_are_not_compressed(self):
+        payload = compression.compress(self.small, 6, 512)
+        self.assertEqual(payload, self.small)
+        self.assertFalse(compression.is_compressed(payload))
+
+    def test_large_messages_are_compressed(self):
+        payload = compression.compress(self.large, 6, 512)
+        self.assertTrue(compression.is_compressed(payload))
+        self.assertLess(len(payload), len(self.large))
+        self.assertEqual(compression.decompress(payload), self.large)
+
+    def test_level_zero_disables_compression(self):
+        self.assertEqual(compression.compress(self.large, 0, 0), self.large)
+
+    def test_legacy_peers_get_zlib_streams(self):
+        # Peers without the 'plain' capability inflate everything
+        for level in (0, 6):
+            payload = compression.compress(self.small, level, 512, False)
+            self.assertTrue(compression.is_compressed(payload))
+            self.assertEqual(zlib.decompress(payload), self.small)
+
+    def test_decompress(self):
+        # Messages from peers that compress everything at level 9
+        self.assertEqual(
+            compression.decompress(zlib.compress(self.small, 9)), self.small
+        )
+        self.assertEqual(compression.decompress(self.small), self.small)
+
+
+if __name__ == '__main__':
+    unittest.main()
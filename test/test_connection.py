@@ -1,8 +1,9 @@
 import unittest
 
 import mock
+import pyelliptic as ec
 
-from node import connection
+from node import connection, envelope, session_crypto
 
 
 class TestPeerConnection(unittest.TestCase):
@@ -40,6 +41,8 @@ class TestPeerConnection(unittest.TestCase):
         self.assertEqual(self.pc1.nickname, self.default_nickname)
         self.assertEqual(self.pc1.responses_received, self.responses_received)
         self.assertIsNotNone(self.pc1.ctx)
+        # All connections share the process-wide context
+        self.assertIs(self.pc1.ctx, self.pc2.ctx)
 
         self.assertEqual(self.pc2.nickname, self.nickname)
 
@@ -92,6 +95,8 @@ class TestCryptoPeerConnection(TestPeerConnection):
 
         self.assertEqual(self.pc2.pub, self.pub)
         self.assertEqual(self.pc2.guid, self.guid)
+        self.assertEqual(self.pc2.guid_long, long(self.guid, 16))
+        self.assertIsNone(self.pc1.guid_long)
         self.assertEqual(self.pc2.sin, self.sin)
 
     def test_eq(self):
@@ -140,6 +145,97 @@ class TestCryptoPeerConnection(TestPeerConnection):
     def test_repr(self):
         self.assertEqual(self.pc2.__repr__(), str(self.pc2))
 
+    def test_is_reachable(self):
+        transport = mock.Mock()
+        pc = connection.CryptoPeerConnection(transport, self.address)
+        submit = transport.probe_pool.submit
+
+        # Unknown peers are assumed reachable and probed in the background
+        self.assertTrue(pc.is_reachable())
+        submit.assert_called_once_with(pc._probe_reachability)
+
+        # Only one probe is in flight at a time
+        self.assertTrue(pc.is_reachable())
+        self.assertEqual(submit.call_count, 1)
+
+        with mock.patch.object(pc, 'check_port', return_value=False):
+            pc._probe_reachability()
+        self.assertFalse(pc.is_reachable())
+        self.assertEqual(submit.call_count, 1)
+
+        # A response proves the peer is back
+        pc._peer_responded({'type': 'ok'})
+        self.assertTrue(pc.is_reachable())
+        self.assertEqual(submit.call_count, 1)
+
+        # A timed out request triggers a new probe right away
+        pc._peer_timed_out()
+        self.assertEqual(submit.call_count, 2)
+
+    def test_supports_sessions(self):
+        pc = self._mk_complete_CPC()
+
+        # Peers that did not advertise sessions get per message ECIES
+        pc._peer_responded({'type': 'ok'})
+        self.assertFalse(pc.supports_sessions)
+        self.assertIsNone(pc.get_session())
+
+        pc._peer_responded({'type': 'ok', 'capabilities': ['session']})
+        self.assertTrue(pc.supports_sessions)
+
+    def test_supports_uncompressed(self):
+        pc = self._mk_complete_CPC()
+        self.assertFalse(pc.supports_uncompressed)
+
+        pc._peer_responded({'type': 'ok', 'capabilities': ['plain']})
+        self.assertTrue(pc.supports_uncompressed)
+
+
+class TestCryptoPeerListener(unittest.TestCase):
+
+    @staticmethod
+    def _hex_pubkey(key):
+        return '04' + key.pubkey_x.encode('hex') + key.pubkey_y.encode('hex')
+
+    def setUp(self):
+        key = ec.ECC(curve='secp256k1')
+        self.pubkey = self._hex_pubkey(key)
+        self.data_cb = mock.Mock()
+        self.listener = connection.CryptoPeerListener(
+            '127.0.0.1', 12345, self.pubkey,
+            key.privkey.encode('hex'), self.data_cb
+        )
+        self.listener.stream = mock.Mock()
+        self.listener.set_ok_msg({'type': 'ok'})
+
+    def _bad_session_message(self, **fields):
+        sender = ec.ECC(curve='secp256k1')
+        session = session_crypto.OutboundSession(
+            sender, self._hex_pubkey(sender), self.pubkey
+        )
+        # A header signed by its sender around a garbage wrapped key
+        session.wrapped_key = 'junk' * 30
+        session.signature = sender.sign(session_crypto._header(
+            session.session_id, session.created, session.wrapped_key
+        ))
+        sealed = session.seal('{"type": "hello"}')
+        sealed.update(fields)
+        return envelope.encode(envelope.SESSION, sealed)
+
+    def test_replies_to_bad_session_messages(self):
+        for msg in (self._bad_session_message(),
+                    self._bad_session_message(spub='04' + '00' * 64),
+                    self._bad_session_message(ctr=2 ** 64)):
+            self.listener.stream.send.reset_mock()
+            self.listener._handle_recv([msg])
+            self.listener.stream.send.assert_called_once_with('{"type": "ok"}')
+        self.assertFalse(self.data_cb.called)
+
+    def test_replies_when_handling_fails(self):
+        self.listener._on_raw_message = mock.Mock(side_effect=Exception)
+        self.listener._handle_recv(['message'])
+        self.listener.stream.send.assert_called_once_with('{"type": "ok"}')
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+import mock
+
+from node import crypto_util
+
+
+class TestCryptorCache(unittest.TestCase):
+
+    def setUp(self):
+        crypto_util._priv_cryptors.clear()
+        crypto_util._pub_cryptors.clear()
+
+    @mock.patch.object(crypto_util, 'makePrivCryptor')
+    def test_get_priv_cryptor(self, make):
+        make.side_effect = lambda key: mock.Mock(name=key)
+
+        cryptor = crypto_util.getPrivCryptor('secret')
+        self.assertIs(crypto_util.getPrivCryptor('secret'), cryptor)
+        make.assert_called_once_with('secret')
+
+        self.assertIsNot(crypto_util.getPrivCryptor('other'), cryptor)
+        self.assertEqual(make.call_count, 2)
+
+    @mock.patch.object(crypto_util, 'makePubCryptor')
+    def test_get_pub_cryptor(self, make):
+        make.side_effect = lambda key: mock.Mock(name=key)
+
+        cryptor = crypto_util.getPubCryptor('04abcd')
+        self.assertIs(crypto_util.getPubCryptor('04abcd'), cryptor)
+        make.assert_called_once_with('04abcd')
+
+    @mock.patch.object(crypto_util, 'makePubCryptor')
+    def test_pub_cryptor_cache_is_bounded(self, make):
+        make.side_effect = lambda key: mock.Mock(name=key)
+
+        with mock.patch.object(crypto_util, '_pub_cryptors',
+                               crypto_util.LRUCache(2)):
+            for key in ('04a', '04b', '04c'):
+                crypto_util.getPubCryptor(key)
+            self.assertEqual(len(crypto_util._pub_cryptors), 2)
+
+            # The least recently used key had to be rebuilt
+            crypto_util.getPubCryptor('04a')
+            self.assertEqual(make.call_count, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
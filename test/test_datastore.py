@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+import os
+import unittest
+
+from node.datastore import SqliteDataStore
+from node.db_store import Obdb
+from node.setup_db import setup_db
+
+TEST_DB_PATH = "test/test_datastore.db"
+
+
+def setUpModule():
+    # Create a test db.
+    if not os.path.isfile(TEST_DB_PATH):
+        setup_db(TEST_DB_PATH)
+
+
+def tearDownModule():
+    # Cleanup.
+    os.remove(TEST_DB_PATH)
+
+
+class TestSqliteDataStore(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Obdb(TEST_DB_PATH)
+        self.store = SqliteDataStore(self.db)
+
+    def tearDown(self):
+        self.db.deleteEntries("datastore")
+        self.db.close()
+
+    def test_set_get(self):
+        self.store.setItem('aa', {'listings': ['x']}, 20, 10, 'pub', 1)
+
+        self.assertEqual(self.store['aa'], {'listings': ['x']})
+        self.assertEqual(self.store.lastPublished('aa'), 20)
+        self.assertEqual(self.store.originalPublishTime('aa'), 10)
+        self.assertEqual(self.store.originalPublisherID('aa'), 'pub')
+        self.assertIsNone(self.store['bb'])
+
+    def test_write_through(self):
+        self.store.setItem('aa', 'first', 20, 10, 'pub', 1)
+        self.store.setItem('aa', 'second', 30, 10, 'pub', 1)
+
+        # The database holds one row with the latest value...
+        rows = self.db.selectEntries("datastore", {"key": "aa"})
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['value'], 'second')
+
+        # ...and a fresh store reading from disk agrees with the cache
+        fresh = SqliteDataStore(self.db)
+        self.assertEqual(fresh['aa'], self.store['aa'])
+        self.assertEqual(fresh.lastPublished('aa'),
+                         self.store.lastPublished('aa'))
+
+    def test_miss_racing_with_write(self):
+        self.store.setItem('aa', 'old', 20, 10, 'pub', 1)
+        self.store._cache.clear()
+
+        select = self.db.selectEntries
+
+        def slow_select(*args, **kwargs):
+            # The row is read, then replaced before the read is cached
+            rows = select(*args, **kwargs)
+            self.store.setItem('aa', 'new', 30, 10, 'pub', 1)
+            return rows
+
+        self.db.selectEntries = slow_select
+        self.assertEqual(self.store['aa'], 'old')
+        self.db.selectEntries = select
+
+        self.assertEqual(self.store['aa'], 'new')
+        self.assertEqual(self.store.lastPublished('aa'), 30)
+
+    def test_cached_value_is_not_shared(self):
+        self.store.setItem('aa', {'listings': ['x']}, 20, 10, 'pub', 1)
+
+        value = self.store['aa']
+        value['listings'].append('y')
+        self.assertEqual(self.store['aa'], {'listings': ['x']})
+
+    def test_delete(self):
+        self.store.setItem('aa'.encode('hex'), 'value', 20, 10, 'pub', 1)
+        self.assertEqual(self.store['aa'.encode('hex')], 'value')
+
+        del self.store['aa']
+        self.assertIsNone(self.store['aa'.encode('hex')])
+
+    def test_iter_rows(self):
+        self.store.setItem('aa', 'one', 20, 10, 'pub', 1)
+        self.store.setItem('bb', {'listings': []}, 40, 30, 'other', 1)
+
+        rows = sorted(self.store.iterRows())
+        self.assertEqual(rows, [
+            ('aa', 'one', 20, 10, 'pub'),
+            ('bb', {'listings': []}, 40, 30, 'other')
+        ])
+
+    def test_delete_keys(self):
+        for key in ('aa', 'bb', 'cc'):
+            self.store.setItem(key, 'value', 20, 10, 'pub', 1)
+
+        self.store.deleteKeys(['aa', 'cc'])
+
+        self.assertEqual([row[0] for row in self.store.iterRows()], ['bb'])
+        self.assertIsNone(self.store['aa'])
+        self.assertEqual(self.store['bb'], 'value')
+
+
+if __name__ == '__main__':
+    unittest.main()
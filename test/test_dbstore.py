@@ -156,5 +156,123 @@ class TestDbOperations(unittest.TestCase):
         retrieved_review = db.selectEntries("reviews", {"pubkey": "123"})
         self.assertEqual(len(retrieved_review), 0)
 
+    def test_connection_reuse(self):
+
+        # Initialize our db instance
+        db = Obdb(TEST_DB_PATH)
+
+        # Queries issued by the same thread share one connection
+        db.selectEntries("reviews")
+        con = db._connectToDb()
+        db.selectEntries("reviews")
+        self.assertIs(con, db._connectToDb())
+
+        # Closing the pool makes the next query open a fresh connection
+        db.close()
+        db.selectEntries("reviews")
+        self.assertIsNot(con, db._connectToDb())
+        db.close()
+
+    def test_transaction(self):
+
+        # Initialize our db instance
+        db = Obdb(TEST_DB_PATH)
+
+        # Statements in a committed transaction are all stored
+        with db.transaction():
+            db.insertEntry("peers", {"guid": "tx1", "uri": "tcp://1.1.1.1:1"})
+            db.insertEntry("peers", {"guid": "tx2", "uri": "tcp://1.1.1.1:2"})
+        self.assertEqual(len(db.selectEntries("peers", {"guid": "tx1"})), 1)
+        self.assertEqual(len(db.selectEntries("peers", {"guid": "tx2"})), 1)
+
+        # An exception rolls back every statement of the transaction
+        try:
+            with db.transaction():
+                db.deleteEntries("peers", {"guid": "tx1"})
+                db.insertEntry("peers", {"guid": "tx3"})
+                raise RuntimeError("abort")
+        except RuntimeError:
+            pass
+        self.assertEqual(len(db.selectEntries("peers", {"guid": "tx1"})), 1)
+        self.assertEqual(len(db.selectEntries("peers", {"guid": "tx3"})), 0)
+
+        db.deleteEntries("peers")
+
+    def test_insert_update_many(self):
+
+        # Initialize our db instance
+        db = Obdb(TEST_DB_PATH)
+
+        db.insertMany("peers", [
+            {"guid": "many1", "uri": "tcp://1.1.1.1:1", "nickname": "a"},
+            {"guid": "many2", "uri": "tcp://1.1.1.1:2", "nickname": "b"},
+            {"guid": "many3", "nickname": "c"}
+        ])
+        self.assertEqual(len(db.selectEntries("peers")), 3)
+        self.assertEqual(
+            db.selectEntries("peers", {"guid": "many2"})[0]["uri"],
+            "tcp://1.1.1.1:2"
+        )
+
+        db.updateMany("peers", [
+            ({"guid": "many1"}, {"nickname": "x"}),
+            ({"guid": "many3"}, {"nickname": "z"})
+        ])
+        self.assertEqual(
+            db.selectEntries("peers", {"guid": "many1"})[0]["nickname"], "x"
+        )
+        self.assertEqual(
+            db.selectEntries("peers", {"guid": "many2"})[0]["nickname"], "b"
+        )
+        self.assertEqual(
+            db.selectEntries("peers", {"guid": "many3"})[0]["nickname"], "z"
+        )
+
+        db.deleteEntries("peers")
+
+    def test_select_order(self):
+
+        # Initialize our db instance
+        db = Obdb(TEST_DB_PATH)
+
+        db.insertMany("peers", [
+            {"guid": "order1", "updated": 2},
+            {"guid": "order2", "updated": 1},
+            {"guid": "order3", "updated": 2}
+        ])
+        rows = db.selectEntries("peers", order_field=["updated", "id"],
+                                order="DESC")
+        self.assertEqual([row["guid"] for row in rows],
+                         ["order3", "order1", "order2"])
+
+        rows = db.selectEntries("peers", order_field="updated", limit=1)
+        self.assertEqual(rows[0]["guid"], "order2")
+
+        db.deleteEntries("peers")
+
+    def test_upsert_operation(self):
+
+        # Initialize our db instance
+        db = Obdb(TEST_DB_PATH)
+
+        row = {"key": "abcd", "market_id": 1, "value": "first"}
+        db.upsertEntry("datastore", row)
+
+        # Writing the same (key, market_id) again replaces the row
+        row["value"] = "second"
+        db.upsertEntry("datastore", row)
+        rows = db.selectEntries("datastore", {"key": "abcd"})
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["value"], "second")
+
+        # The same key in another market is a different row
+        db.upsertEntry("datastore",
+                       {"key": "abcd", "market_id": 2, "value": "other"})
+        self.assertEqual(
+            len(db.selectEntries("datastore", {"key": "abcd"})), 2
+        )
+
+        db.deleteEntries("datastore")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,229 @@
+import time
+import unittest
+
+import mock
+
+from node import constants, datastore, dht
+
+
+class TestDHT(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.guid = 'a' * 40
+        cls.market_id = 1
+
+    def setUp(self):
+        self.transport = mock.Mock()
+        self.transport.guid = self.guid
+        self.dht = dht.DHT(
+            self.transport,
+            self.market_id,
+            {'guid': self.guid},
+            None
+        )
+        self.dht.dataStore = datastore.DictDataStore()
+        self.dht.iterativeStore = mock.Mock()
+        self.dht._io_loop = mock.Mock()
+
+        # Run pooled work right away
+        self.transport.worker_pool.submit.side_effect = \
+            lambda func, *args, **kwargs: func(*args, **kwargs)
+
+    def test_republish_sweep(self):
+        now = int(time.time())
+        old = now - constants.replicateInterval
+        self.dht.dataStore.dict = {
+            'mine': ('v1', now, now, self.guid),
+            'stale': ('v2', old, now, 'b' * 40),
+            'fresh': ('v3', now, now, 'c' * 40),
+            'nodeState'.encode('hex'): ('v4', old, old, 'd' * 40)
+        }
+
+        # Nothing expires; only replicated data not published for a
+        # replicate interval is stored again
+        with mock.patch.object(dht.constants, 'dataExpireTimeout', 10 ** 9):
+            self.dht._threadedRepublishData()
+
+        self.dht.iterativeStore.assert_called_once_with(
+            self.transport, 'stale', 'v2', 'b' * 40, mock.ANY
+        )
+        self.assertEqual(len(self.dht.dataStore.dict), 4)
+
+    def test_republish_sweep_expires(self):
+        now = int(time.time())
+        self.dht.dataStore.dict = {
+            'mine': ('v1', now, now, self.guid),
+            'theirs': ('v2', now, now, 'b' * 40)
+        }
+
+        self.dht._threadedRepublishData()
+
+        # Own data is republished, other publishers' expired data is dropped
+        self.dht.iterativeStore.assert_called_once_with(
+            self.transport, 'mine', 'v1', None, 0
+        )
+        self.assertEqual(list(self.dht.dataStore.dict), ['mine'])
+
+    def _start_search(self, count, callback=None):
+        """ Start a findNode search with `count` reachable nodes. """
+        self.contacts = {}
+        shortlist = []
+        for i in range(count):
+            guid = '%040x' % (i + 1)
+            contact = mock.Mock()
+            contact.guid = guid
+            self.contacts[guid] = contact
+            shortlist.append(('10.0.0.%d' % i, 12345, guid))
+        self.dht.routingTable.getContact = self.contacts.get
+
+        search = dht.DHTSearch(self.market_id, '0' * 40, callback=callback)
+        search.shortlist = shortlist
+        self.dht.searches[search.findID] = search
+        self.dht._searchIteration(search)
+        return search
+
+    def _respond(self, search, guid, foundNodes=()):
+        self.dht.on_findNodeResponse(self.transport, {
+            'senderGUID': guid,
+            'senderNick': 'nick',
+            'pubkey': 'pubkey',
+            'uri': 'tcp://10.0.0.1:12345',
+            'findID': search.findID,
+            'foundNodes': list(foundNodes)
+        })
+
+    def _probed(self):
+        return sorted(guid for guid, contact in self.contacts.items()
+                      if contact.send.called)
+
+    def test_search_shortlist(self):
+        search = dht.DHTSearch(self.market_id, '0' * 40)
+        far = ('10.0.0.1', 12345, 'f' * 40)
+        near = ('10.0.0.2', 12345, '0' * 39 + '1')
+        middle = ('10.0.0.3', 12345, '8' * 40, 'nick')
+        unknown = ('tcp://10.0.0.4:12345', None, None)
+
+        search.add_to_shortlist([far, unknown, near])
+        search.add_to_shortlist([middle, near, far[:2] + (far[2], 'nick')])
+        self.assertEqual(search.shortlist, [near, middle, far, unknown])
+        self.assertEqual(search.closest(2), [near, middle])
+
+        search.shortlist = [far]
+        self.assertEqual(search.shortlist, [far])
+
+    def test_search_probes_alpha_closest(self):
+        search = self._start_search(10)
+
+        self.assertEqual(len(search.active_probes), constants.alpha)
+        self.assertEqual(self._probed(),
+                         sorted(self.contacts)[:constants.alpha])
+        self.assertEqual(self.dht._io_loop.add_callback.call_count,
+                         constants.alpha)
+
+        # Each response frees a slot for the next closest node
+        self._respond(search, '%040x' % 1)
+        self.assertEqual(len(search.active_probes), constants.alpha)
+        self.assertEqual(self._probed(),
+                         sorted(self.contacts)[:constants.alpha + 1])
+
+    def test_search_probe_timeout(self):
+        search = self._start_search(10)
+        slow = sorted(search.active_probes)[0]
+
+        self.dht._probeTimedOut(search, slow)
+        self.assertNotIn(slow, search.active_probes)
+        self.assertEqual(len(search.active_probes), constants.alpha)
+        self.assertEqual(len(self._probed()), constants.alpha + 1)
+
+        # A late response does not end any other probe
+        self._respond(search, slow)
+        self.assertEqual(len(search.active_probes), constants.alpha)
+
+    @mock.patch('time.time')
+    def test_search_slow_response(self, time_mock):
+        time_mock.return_value = 1000.0
+        search = self._start_search(10)
+        slow = sorted(search.active_probes)[0]
+
+        # The IOLoop runs the probe timeouts due by the time the response
+        # comes, half a second later
+        for call in self.dht._io_loop.add_callback.call_args_list:
+            _, deadline, on_timeout = call[0]
+            self.assertEqual(deadline, 1000.0 + constants.findNodeTimeout)
+            if deadline <= 1000.5:
+                on_timeout()
+
+        self.assertIn(slow, search.active_probes)
+        self.dht.add_peer = mock.Mock()
+        self._respond(search, slow, [
+            ['%040x' % 99, 'tcp://10.0.0.99:12345', 'pub', 'nick']
+        ])
+        self.assertNotIn(slow, search.active_probes)
+        self.assertIn(('10.0.0.99', 12345, '%040x' % 99, 'nick'),
+                      search.shortlist)
+        self.assertIn(search.findID, self.dht.searches)
+
+    def test_search_converges(self):
+        callback = mock.Mock()
+        search = self._start_search(constants.alpha + 1, callback)
+
+        for guid in sorted(self.contacts):
+            self._respond(search, guid)
+
+        callback.assert_called_once_with(search.shortlist)
+        self.assertTrue(search.finished)
+        self.assertNotIn(search.findID, self.dht.searches)
+
+        # Nothing happens after the search finished
+        self.dht._probeTimedOut(search, '%040x' % 1)
+        self._respond(search, '%040x' % 1)
+        self.assertEqual(callback.call_count, 1)
+
+    def test_search_without_nodes(self):
+        callback = mock.Mock()
+        self.dht.routingTable = mock.Mock()
+        self.dht.routingTable.findCloseNodes.return_value = []
+
+        self.dht.iterativeFindNode('b' * 40, callback)
+        callback.assert_called_once_with([])
+        self.assertEqual(self.dht.searches, {})
+
+    def test_search_invalid_key(self):
+        callback = mock.Mock()
+        self.dht.routingTable = mock.Mock()
+
+        for key in ('not a guid', None):
+            self.dht.iterativeFindNode(key, callback)
+            callback.assert_called_once_with([])
+            callback.reset_mock()
+
+        self.assertEqual(self.dht.searches, {})
+        self.assertFalse(self.dht.routingTable.findCloseNodes.called)
+
+    def test_reap_searches(self):
+        callback = mock.Mock()
+        self.dht.routingTable = mock.Mock()
+        self.dht.routingTable.findCloseNodes.return_value = [
+            mock.Mock(ip='10.0.0.1', port=12345, guid='b' * 40)
+        ]
+        self.dht.iterativeFindNode('b' * 40, callback)
+        self.dht.iterativeFindNode('c' * 40)
+        self.assertEqual(len(self.dht.searches), 2)
+
+        old, new = sorted(self.dht.searches.values(), key=lambda s: s.key)
+        old.created -= constants.searchTTL + 1
+        self.dht._reapSearches()
+
+        self.assertEqual(self.dht.searches, {new.findID: new})
+        callback.assert_called_once_with(old.shortlist)
+        self.assertEqual(self.dht.getSearchStats(), {
+            'active': 1,
+            'started': 2,
+            'completed': 0,
+            'expired': 1
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import json
+import unittest
+
+from node import envelope
+
+
+class TestEnvelope(unittest.TestCase):
+
+    def setUp(self):
+        self.ecies = {'sig': '\x30\x45' + '\x01' * 70, 'data': '\x00\xff' * 50}
+        self.session = {
+            'session': '\x07' * 16,
+            'created': 1400000000,
+            'skey': '\x02' * 100,
+            'ssig': '\x30' * 71,
+            'spub': '04' + 'ab' * 64,
+            'ctr': 5,
+            'iv': '\x09' * 16,
+            'data': 'ciphertext',
+            'mac': '\x0a' * 32
+        }
+
+    def test_round_trip(self):
+        for kind, fields in ((envelope.ECIES, self.ecies),
+                             (envelope.SESSION, self.session)):
+            for binary in (False, True):
+                serialized = envelope.encode(kind, fields, binary)
+                self.assertEqual(envelope.is_binary(serialized), binary)
+                self.assertEqual(envelope.decode(serialized), (kind, fields))
+
+    def test_json_envelope(self):
+        # Peers without the binary capability get the hex encoded format
+        msg = json.loads(envelope.encode(envelope.ECIES, self.ecies))
+        self.assertEqual(msg['sig'], self.ecies['sig'].encode('hex'))
+        self.assertEqual(msg['data'], self.ecies['data'].encode('hex'))
+
+    def test_binary_envelope_is_smaller(self):
+        self.assertLess(
+            len(envelope.encode(envelope.SESSION, self.session, True)),
+            len(envelope.encode(envelope.SESSION, self.session, False))
+        )
+
+    def test_plain_message(self):
+        msg = {'type': 'hello', 'senderGUID': 'guid'}
+        self.assertEqual(envelope.decode(json.dumps(msg)), (None, msg))
+
+    def test_malformed(self):
+        serialized = envelope.encode(envelope.ECIES, self.ecies, True)
+        self.assertRaises(envelope.EnvelopeError, envelope.decode,
+                          serialized[:-1])
+        self.assertRaises(envelope.EnvelopeError, envelope.decode,
+                          serialized + 'x')
+        self.assertRaises(envelope.EnvelopeError, envelope.decode,
+                          serialized[:1] + '\x09' + serialized[2:])
+        self.assertRaises(ValueError, envelope.decode, 'garbage')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -315,6 +315,62 @@ class TestKbucket(unittest.TestCase):
             "Contact list was modified before raising exception."
         )
 
+    def testAddContact_moves_to_tail(self):
+        first = self._mk_contact_by_num(self.range_min)
+        self.bucket.addContact(first)
+
+        ids = [int(c.guid) for c in self.bucket.contacts]
+        self.assertEqual(
+            ids,
+            range(self.range_min + 1, self.range_min + self.init_contact_count)
+            + [self.range_min]
+        )
+
+    def testAddContact_full_keeps_least_recently_seen_first(self):
+        self.bucket.addContact(self._mk_contact_by_num(self.range_max - 1))
+        # Seeing the head again makes the next contact the one to evict
+        self.bucket.addContact(self._mk_contact_by_num(self.range_min))
+
+        with self.assertRaises(kbucket.BucketFull):
+            self.bucket.addContact(self._mk_contact_by_num(self.range_max - 2))
+        self.assertEqual(self.bucket.contacts[0].guid,
+                         str(self.range_min + 1))
+        self.assertEqual(self.bucket.contacts[-1].guid, str(self.range_min))
+
+        # Once it is removed, there is room for the new contact
+        self.bucket.removeContact(str(self.range_min + 1))
+        self.assertIsNone(self.bucket.getContact(str(self.range_min + 1)))
+        self.bucket.addContact(self._mk_contact_by_num(self.range_max - 2))
+        self.assertEqual(len(self.bucket), constants.k)
+
+    def testGetContact_after_remove(self):
+        c_id = str(self.range_min + 1)
+        self.bucket.removeContact(c_id)
+        self.assertIsNone(self.bucket.getContact(c_id))
+        self.assertEqual(self.bucket.getContact(str(self.range_min)).guid,
+                         str(self.range_min))
+        self.assertEqual(len(self.bucket), self.init_contact_count - 1)
+
+    def testGuidChange(self):
+        contact = self.bucket.contacts[0]
+        old_guid = contact.guid
+        contact.guid = str(self.range_max - 1)
+
+        # The contact is not found under either GUID until it is added again
+        self.assertIsNone(self.bucket.getContact(old_guid))
+        self.assertIsNone(self.bucket.getContact(contact.guid))
+
+        self.bucket.addContact(contact)
+        self.assertIs(self.bucket.getContact(contact.guid), contact)
+        self.assertIsNone(self.bucket.getContact(old_guid))
+        self.assertEqual(len(self.bucket), self.init_contact_count)
+
+        # Contacts are also removed through the object whatever their GUID
+        contact.guid = old_guid
+        self.bucket.removeContact(contact)
+        self.assertEqual(len(self.bucket), self.init_contact_count - 1)
+        self.assertNotIn(contact, self.bucket.contacts)
+
     def testkeyInRange(self):
         self.assertTrue(self.bucket.keyInRange(self.range_min))
         self.assertTrue(self.bucket.keyInRange(self.range_max - 1))
@@ -0,0 +1,55 @@
+import unittest
+
+from node.known_nodes import KnownNode, KnownNodes
+
+
+class TestKnownNodes(unittest.TestCase):
+
+    def setUp(self):
+        self.nodes = KnownNodes(max_size=3, max_age=100)
+
+    def test_add(self):
+        self.nodes.add('tcp://10.0.0.1:12345', 'a' * 40, 'alice', now=0)
+        node = KnownNode('10.0.0.1', 12345, 'a' * 40, 'alice')
+        self.assertEqual(list(self.nodes), [node])
+        self.assertIn(('10.0.0.1', 12345, 'a' * 40, 'alice'), self.nodes)
+        self.assertNotIn(('10.0.0.1', 12345, 'a' * 40, 'bob'), self.nodes)
+
+        # Nodes without a GUID are ignored
+        self.nodes.add('tcp://10.0.0.2:12345', None, now=0)
+        self.assertEqual(len(self.nodes), 1)
+
+    def test_update(self):
+        self.nodes.add('tcp://10.0.0.1:12345', 'a' * 40, 'alice', 'pub', 0)
+        self.nodes.add('tcp://10.0.0.2:12345', 'a' * 40, now=1)
+        self.assertEqual(len(self.nodes), 1)
+        self.assertEqual(
+            self.nodes.get('a' * 40),
+            (KnownNode('10.0.0.2', 12345, 'a' * 40, 'alice'), 'pub', 1)
+        )
+        self.assertTrue(self.nodes.is_known(
+            'tcp://10.0.0.2:12345', 'pub', 'a' * 40, 'alice'
+        ))
+        self.assertFalse(self.nodes.is_known(
+            'tcp://10.0.0.1:12345', 'pub', 'a' * 40, 'alice'
+        ))
+
+    def test_evict_least_recently_seen(self):
+        for i, guid in enumerate('abc'):
+            self.nodes.add('tcp://10.0.0.1:%d' % i, guid * 40, now=i)
+        # Seeing a node again makes it the most recently seen
+        self.nodes.add('tcp://10.0.0.1:0', 'a' * 40, now=3)
+        self.nodes.add('tcp://10.0.0.1:4', 'd' * 40, now=4)
+
+        self.assertEqual([node.guid[0] for node in self.nodes],
+                         ['c', 'a', 'd'])
+
+    def test_expire(self):
+        self.nodes.add('tcp://10.0.0.1:12345', 'a' * 40, now=0)
+        self.nodes.add('tcp://10.0.0.2:12345', 'b' * 40, now=50)
+        self.nodes.add('tcp://10.0.0.3:12345', 'c' * 40, now=120)
+        self.assertEqual([node.guid[0] for node in self.nodes], ['b', 'c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
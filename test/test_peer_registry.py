@@ -0,0 +1,75 @@
+import unittest
+
+from node.peer_registry import PeerRegistry
+
+
+class Peer(object):
+    def __init__(self, guid, address):
+        self.guid = guid
+        self.address = address
+
+
+class TestPeerRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = PeerRegistry()
+        self.peer = Peer('a' * 40, 'tcp://10.0.0.1:12345')
+
+    def test_add(self):
+        self.assertFalse(self.registry.add(self.peer))
+        self.assertEqual(len(self.registry), 1)
+        self.assertIs(self.registry.get_by_guid(self.peer.guid), self.peer)
+        self.assertIs(self.registry.get_by_uri(self.peer.address), self.peer)
+
+        # Adding a known peer again only reindexes it
+        self.assertTrue(self.registry.add(self.peer))
+        self.assertEqual(list(self.registry), [self.peer])
+
+    def test_add_replaces(self):
+        self.registry.add(self.peer)
+        other = Peer('b' * 40, 'tcp://10.0.0.2:12345')
+        self.registry.add(other)
+
+        # Same GUID at a new address
+        moved = Peer(self.peer.guid, 'tcp://10.0.0.3:12345')
+        self.assertTrue(self.registry.add(moved))
+        self.assertEqual(list(self.registry), [other, moved])
+        self.assertIsNone(self.registry.get_by_uri(self.peer.address))
+
+        # New GUID at a known address
+        renamed = Peer('c' * 40, other.address)
+        self.assertTrue(self.registry.add(renamed))
+        self.assertEqual(list(self.registry), [moved, renamed])
+        self.assertIsNone(self.registry.get_by_guid(other.guid))
+
+    def test_peer_without_guid(self):
+        peer = Peer(None, 'tcp://10.0.0.2:12345')
+        self.registry.add(peer)
+        self.assertIsNone(self.registry.get_by_guid(None))
+
+        # Once the handshake tells its GUID, the peer is reindexed
+        peer.guid = 'b' * 40
+        self.assertIsNone(self.registry.get_by_guid(peer.guid))
+        self.assertTrue(self.registry.add(peer))
+        self.assertIs(self.registry.get_by_guid(peer.guid), peer)
+        self.assertEqual(len(self.registry), 1)
+
+    def test_stale_lookups(self):
+        self.registry.add(self.peer)
+        old_address = self.peer.address
+        self.peer.address = 'tcp://10.0.0.2:12345'
+        self.assertIsNone(self.registry.get_by_uri(old_address))
+
+    def test_remove(self):
+        self.registry.add(self.peer)
+        self.registry.remove(self.peer)
+        self.assertEqual(len(self.registry), 0)
+        self.assertIsNone(self.registry.get_by_guid(self.peer.guid))
+        self.assertIsNone(self.registry.get_by_uri(self.peer.address))
+
+        # Unknown peers are ignored
+        self.registry.remove(self.peer)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+import mock
+
+from node.peer_store import PeerStore
+
+
+class TestPeerStore(unittest.TestCase):
+
+    def setUp(self):
+        self.db = mock.MagicMock()
+        self.store = PeerStore(self.db, 1)
+
+    def _inserted(self):
+        rows = [c[0][1] for c in self.db.insertEntry.call_args_list]
+        for row in rows:
+            self.assertIsInstance(row.pop('updated'), int)
+        return rows
+
+    def test_save_dedupes(self):
+        self.store.save(('tcp://10.0.0.1:1', 'pub1', 'a' * 40, 'alice'))
+        self.store.save(('tcp://10.0.0.2:1', 'pub2', 'b' * 40, 'bob'))
+        self.store.save(('tcp://10.0.0.3:1', 'pub1', 'a' * 40, 'alice2'))
+        self.assertEqual(self.store.pending(), 2)
+        self.assertFalse(self.db.insertEntry.called)
+
+        self.store.flush()
+        self.assertEqual(self.store.pending(), 0)
+        self.assertEqual(self.db.transaction.call_count, 1)
+        self.db.deleteMany.assert_has_calls([
+            mock.call('peers', 'uri', ['tcp://10.0.0.2:1', 'tcp://10.0.0.3:1']),
+            mock.call('peers', 'guid', ['b' * 40, 'a' * 40])
+        ])
+        self.assertEqual(self._inserted(), [
+            {'uri': 'tcp://10.0.0.2:1', 'pubkey': 'pub2', 'guid': 'b' * 40,
+             'nickname': 'bob', 'market_id': 1},
+            {'uri': 'tcp://10.0.0.3:1', 'pubkey': 'pub1', 'guid': 'a' * 40,
+             'nickname': 'alice2', 'market_id': 1}
+        ])
+
+    def test_last_save_of_a_uri_wins(self):
+        self.store.save(('tcp://10.0.0.1:1', 'pub1', 'a' * 40, 'alice'))
+        self.store.save(('tcp://10.0.0.1:1', 'pub2', 'b' * 40, 'bob'))
+        # Peers without a GUID only clear their URI
+        self.store.save(('tcp://10.0.0.2:1', None, None, None))
+
+        self.store.flush()
+        self.assertEqual([row['guid'] for row in self._inserted()],
+                         ['b' * 40])
+        self.db.deleteMany.assert_any_call(
+            'peers', 'uri', ['tcp://10.0.0.1:1', 'tcp://10.0.0.2:1']
+        )
+
+    def test_failed_flush_is_retried(self):
+        self.store.save(('tcp://10.0.0.1:1', 'pub1', 'a' * 40, 'alice'))
+        self.store.save(('tcp://10.0.0.2:1', 'pub2', 'b' * 40, 'bob'))
+
+        # Alice is saved again while the transaction fails
+        def fail():
+            self.store.save(('tcp://10.0.0.3:1', 'pub1', 'a' * 40, 'alice2'))
+            raise Exception('database is locked')
+        self.db.transaction.side_effect = fail
+        self.store.flush()
+        self.assertEqual(self.store.pending(), 2)
+
+        self.db.transaction.side_effect = None
+        self.db.insertEntry.reset_mock()
+        self.store.flush()
+        self.assertEqual(self.store.pending(), 0)
+        self.assertEqual(self._inserted(), [
+            {'uri': 'tcp://10.0.0.2:1', 'pubkey': 'pub2', 'guid': 'b' * 40,
+             'nickname': 'bob', 'market_id': 1},
+            {'uri': 'tcp://10.0.0.3:1', 'pubkey': 'pub1', 'guid': 'a' * 40,
+             'nickname': 'alice2', 'market_id': 1}
+        ])
+
+    def test_flush_nothing(self):
+        self.store.flush()
+        self.assertFalse(self.db.transaction.called)
+
+    def test_shutdown_flushes(self):
+        self.store.save(('tcp://10.0.0.1:1', 'pub1', 'a' * 40, 'alice'))
+        self.store.shutdown()
+        self.assertEqual(len(self._inserted()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+
+from node import routingtable
+
+
+class Contact(object):
+    def __init__(self, guid):
+        self.guid = guid
+        self.guid_long = long(guid, 16)
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.guid == other.guid
+        elif isinstance(other, str):
+            return self.guid == other
+        return False
+
+
+class TestRoutingTable(unittest.TestCase):
+
+    def setUp(self):
+        self.guid = 'f' * 40
+        self.table = routingtable.TreeRoutingTable(self.guid, 1)
+
+    def test_key_to_long(self):
+        RoutingTable = routingtable.RoutingTable
+        self.assertEqual(RoutingTable.keyToLong('ff'), 255)
+        self.assertEqual(RoutingTable.keyToLong(255L), 255)
+
+    def test_distance(self):
+        distance = routingtable.RoutingTable.distance
+        self.assertEqual(distance('0f', 'f0'), 0xff)
+        self.assertEqual(distance('0f', 0xf0), 0xff)
+        self.assertEqual(distance('ab' * 20, 'ab' * 20), 0)
+
+    def test_contact_key(self):
+        contact = Contact('0a' * 20)
+        self.assertEqual(self.table.contactKey(contact), contact.guid_long)
+
+        # Contacts without a precomputed value
+        contact.guid_long = None
+        self.assertEqual(self.table.contactKey(contact), long('0a' * 20, 16))
+
+    def test_add_get_contact(self):
+        contact = Contact('0a' * 20)
+        self.table.addContact(contact)
+        self.assertEqual(
+            self.table.kbucketIndex(contact.guid),
+            self.table.kbucketIndex(contact.guid_long)
+        )
+        self.assertIs(self.table.getContact(contact.guid), contact)
+
+        self.table.removeContact(contact.guid)
+        self.assertIsNone(self.table.getContact(contact.guid))
+
+    def test_kbucket_index(self):
+        table = routingtable.OptimizedTreeRoutingTable(self.guid, 1)
+
+        # Fill the table until its buckets have been split a few times
+        for i in range(4 * routingtable.constants.k):
+            table.addContact(Contact('%040x' % (2 ** 160 - 1 - i)))
+        self.assertGreater(len(table.buckets), 1)
+        self.assertEqual(
+            table.bucketBounds,
+            [bucket.rangeMin for bucket in table.buckets]
+        )
+
+        for key in (0, 1, 2 ** 100, 2 ** 160 - 1, 2 ** 200 - 1):
+            index = table.kbucketIndex(key)
+            self.assertTrue(table.buckets[index].keyInRange(key))
+
+        # Keys outside of the ID space
+        self.assertEqual(table.kbucketIndex(2 ** 200), len(table.buckets))
+
+    def test_find_close_nodes(self):
+        table = routingtable.OptimizedTreeRoutingTable(self.guid, 1)
+        contacts = [
+            Contact('%040x' % ((i * 0x9e3779b97f4a7c15) % 2 ** 160))
+            for i in range(1, 200)
+        ]
+        for contact in contacts:
+            table.addContact(contact)
+        known = [contact for bucket in table.buckets
+                 for contact in bucket.getContacts()]
+
+        key = '5a' * 20
+        target = long(key, 16)
+        expected = sorted(known, key=lambda c: c.guid_long ^ target)
+
+        k = routingtable.constants.k
+        closest = table.findCloseNodes(key, k)
+        self.assertEqual([c.guid for c in closest],
+                         [c.guid for c in expected[:k]])
+        self.assertEqual(len(table.findCloseNodes(key, 3)), 3)
+
+        # The requesting node is never part of the result
+        closest = table.findCloseNodes(key, k, expected[0].guid)
+        self.assertEqual([c.guid for c in closest],
+                         [c.guid for c in expected[1:k + 1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
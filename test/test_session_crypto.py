@@ -0,0 +1,113 @@
+import unittest
+
+import pyelliptic as ec
+
+from node import envelope, session_crypto
+
+
+def hex_pubkey(key):
+    return '04' + key.pubkey_x.encode('hex') + key.pubkey_y.encode('hex')
+
+
+class TestReplayWindow(unittest.TestCase):
+
+    def test_accept(self):
+        window = session_crypto.ReplayWindow(4)
+        self.assertTrue(window.accept(1))
+        self.assertTrue(window.accept(3))
+        # Out of order, but not seen yet
+        self.assertTrue(window.accept(2))
+        self.assertFalse(window.accept(2))
+        self.assertFalse(window.accept(0))
+
+        self.assertTrue(window.accept(10))
+        # Too old to tell whether it was seen
+        self.assertFalse(window.accept(6))
+        self.assertTrue(window.accept(7))
+
+    def test_large_jump(self):
+        window = session_crypto.ReplayWindow(4)
+        self.assertTrue(window.accept(3))
+        self.assertTrue(window.accept(2 ** 62))
+        self.assertEqual(window.bitmap, 1)
+        self.assertFalse(window.accept(3))
+        self.assertTrue(window.accept(2 ** 62 - 1))
+
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        self.sender = ec.ECC(curve='secp256k1')
+        self.receiver = ec.ECC(curve='secp256k1')
+        self.sessions = session_crypto.InboundSessions(1, 10)
+        self.session = session_crypto.OutboundSession(
+            self.sender, hex_pubkey(self.sender), hex_pubkey(self.receiver)
+        )
+
+    def _open(self, fields):
+        kind, fields = envelope.decode(envelope.encode(envelope.SESSION,
+                                                       fields))
+        return session_crypto.open_envelope(fields, self.receiver,
+                                            self.sessions)
+
+    def test_round_trip(self):
+        for text in ('first message', 'second message'):
+            data, sender_pubkey = self._open(self.session.seal(text))
+            self.assertEqual(data, text)
+            self.assertEqual(sender_pubkey, hex_pubkey(self.sender))
+        self.assertEqual(len(self.sessions), 1)
+
+    def test_replay(self):
+        fields = self.session.seal('message')
+        self._open(fields)
+        self.assertRaises(session_crypto.SessionError, self._open, fields)
+
+    def test_replay_after_eviction(self):
+        fields = self.session.seal('message')
+        self._open(fields)
+
+        # Another session pushes this one out of the cache
+        other = session_crypto.OutboundSession(
+            self.sender, hex_pubkey(self.sender), hex_pubkey(self.receiver)
+        )
+        self._open(other.seal('other message'))
+
+        self.assertRaises(session_crypto.SessionError, self._open, fields)
+        self.assertRaises(session_crypto.SessionError, self._open,
+                          self.session.seal('new message'))
+
+    def test_tampered_message(self):
+        fields = self.session.seal('message')
+        fields['ctr'] += 1
+        self.assertRaises(session_crypto.SessionError, self._open, fields)
+
+    def test_counter_out_of_range(self):
+        for counter in (-1, 0, 2 ** 64):
+            fields = self.session.seal('message')
+            fields['ctr'] = counter
+            self.assertRaises(session_crypto.SessionError, self._open,
+                              fields)
+
+    def test_invalid_sender_key(self):
+        fields = self.session.seal('message')
+        fields['spub'] = '04' + '00' * 64
+        self.assertRaises(session_crypto.SessionError, self._open, fields)
+
+    def test_invalid_wrapped_key(self):
+        # The header is signed by the sender, the wrapped key is garbage
+        self.session.wrapped_key = 'junk' * 30
+        self.session.signature = self.sender.sign(session_crypto._header(
+            self.session.session_id, self.session.created,
+            self.session.wrapped_key
+        ))
+        self.assertRaises(session_crypto.SessionError, self._open,
+                          self.session.seal('message'))
+
+    def test_forged_sender(self):
+        fields = self.session.seal('message')
+        fields['spub'] = hex_pubkey(ec.ECC(curve='secp256k1'))
+        self.assertRaises(session_crypto.SessionError, self._open, fields)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+import mock
+
+from node.util import LRUCache, StartupTimeline
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LRUCache(2)
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.get('a', 42), 42)
+
+        self.cache.put('a', 1)
+        self.assertIn('a', self.cache)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+
+        # Touch 'a' so that 'b' becomes the least recently used entry
+        self.cache.get('a')
+        self.cache.put('c', 3)
+
+        self.assertIn('a', self.cache)
+        self.assertNotIn('b', self.cache)
+        self.assertIn('c', self.cache)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_on_evict(self):
+        evicted = []
+        cache = LRUCache(1, lambda key, value: evicted.append((key, value)))
+        cache.put('a', 1)
+        cache.put('a', 2)
+        self.assertEqual(evicted, [])
+        cache.put('b', 3)
+        self.assertEqual(evicted, [('a', 2)])
+
+    def test_pop_clear(self):
+        self.cache.put('a', 1)
+        self.assertEqual(self.cache.pop('a'), 1)
+        self.assertIsNone(self.cache.pop('a'))
+
+        self.cache.put('b', 2)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_disabled(self):
+        cache = LRUCache(0)
+        cache.put('a', 1)
+        self.assertNotIn('a', cache)
+
+
+class TestStartupTimeline(unittest.TestCase):
+
+    def setUp(self):
+        self.log = mock.Mock()
+        self.timeline = StartupTimeline(self.log)
+
+    def test_phase(self):
+        with self.timeline.phase('database'):
+            pass
+        with self.assertRaises(ValueError):
+            with self.timeline.phase('transport'):
+                raise ValueError()
+
+        phases = self.timeline.summary()['phases']
+        self.assertEqual([name for name, _, _ in phases],
+                         ['database', 'transport'])
+        for _, start, duration in phases:
+            self.assertGreaterEqual(start, 0)
+            self.assertGreaterEqual(duration, 0)
+        self.assertEqual(self.log.info.call_count, 2)
+
+    def test_mark(self):
+        elapsed = self.timeline.mark('listening')
+        self.assertGreaterEqual(elapsed, 0)
+        self.assertEqual(self.timeline.summary()['marks'],
+                         {'listening': elapsed})
+
+
+if __name__ == '__main__':
+    unittest.main()
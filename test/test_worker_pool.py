@@ -0,0 +1,70 @@
+import threading
+import unittest
+
+from node.worker_pool import WorkerPool
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = WorkerPool(2, 'TestPool')
+
+    def tearDown(self):
+        self.pool.shutdown(wait=True)
+
+    def test_init(self):
+        self.assertEqual(self.pool.size, 2)
+        # Workers are only started by the first submission
+        self.assertEqual(self.pool._workers, [])
+
+    def test_submit(self):
+        done = threading.Event()
+        results = []
+
+        def task(a, b=None):
+            results.append((a, b))
+            done.set()
+
+        self.pool.submit(task, 1, b=2)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(results, [(1, 2)])
+        self.assertEqual(len(self.pool._workers), 2)
+
+    def test_stats(self):
+        release = threading.Event()
+
+        def fail():
+            raise RuntimeError("task failure")
+
+        # Keep both workers busy so that the next tasks have to queue up
+        for _ in range(2):
+            self.pool.submit(release.wait)
+        self.pool.submit(lambda: None)
+        self.pool.submit(fail)
+        self.assertGreaterEqual(self.pool.queue_depth(), 1)
+
+        release.set()
+        self.pool.shutdown(wait=True)
+
+        stats = self.pool.stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['submitted'], 4)
+        self.assertEqual(stats['completed'], 3)
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['active'], 0)
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertGreaterEqual(stats['max_queue_depth'], 1)
+
+    def test_shutdown(self):
+        self.pool.submit(lambda: None)
+        self.pool.shutdown(wait=True)
+        for worker in self.pool._workers:
+            self.assertFalse(worker.is_alive())
+
+        # Work submitted after shutdown is dropped
+        self.pool.submit(lambda: None)
+        self.assertEqual(self.pool.stats()['submitted'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()